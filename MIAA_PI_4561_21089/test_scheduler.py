@@ -110,6 +110,9 @@ if __name__ == "__main__":
 
     teachers_chosen = {}
 
+    # Fixed seed so the teacher draw is reproducible
+    random.seed(0)
+
     # Use the new function to assign teachers to courses
     assigned_teachers = assign_teachers_to_courses(teachers_Subject, preferencas_dias_professores)
     print("Assigned Teachers to Courses:")
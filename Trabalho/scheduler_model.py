@@ -13,6 +13,8 @@ class course_scheduler:
         self.max_quantity_subjects_per_day = max_quantity_subjects_per_day
         self.model = None
         self.schedule = None
+        self.session = None
+        self.pinned = {}
         
     def create_model(self):
         # MODEL DEFINITION ----------------------------------------------------------
@@ -100,6 +102,7 @@ class course_scheduler:
         model.objSchedule= pyo.Objective(sense = -maximize, expr =  penalty*(model.vIsubjectTotalDays)+ sum(model.pPreferences[o,i,j,k]*model.vbSubjectSchedule[o,i,j,k] for o in model.sTurmas for i in model.sDays for j in model.sHours for k in model.sSubjectsPerClass))
         
         self.model = model
+        self.pinned = {}
 
     def update_preferences(self, preferences):
         # Update preference constraints
@@ -107,19 +110,69 @@ class course_scheduler:
             self.model.pPreferences[turma, day, hour, subject] = preference_value
 
     def update_constraints(self, constraints):
-        # Update constraint list
-        self.model.ctFixedSlots = pyo.ConstraintList()
-        # Update constraint expressions
-        for turma, day, hour, subject, constraint_value in constraints:
-            if constraint_value == 1:
-                self.model.ctFixedSlots.add(expr=self.model.vbSubjectSchedule[turma, day, hour, subject] == constraint_value)
-            else:
-                self.model.ctFixedSlots.add(expr=self.model.vbSubjectSchedule[turma, day, hour, subject] <= 0)
-
-    def solve_schedule(self):
-        # Solve the scheduling problem
-        opt = pyo.SolverFactory('cbc')
-        res = opt.solve(self.model)
+        # Replace the fixed slots, only the slots that changed are pinned or unpinned
+        wanted = {(turma, day, hour, subject): 1 if constraint_value == 1 else 0
+                  for turma, day, hour, subject, constraint_value in constraints}
+        self.unpin_slots([index for index in self.pinned if index not in wanted])
+        self.pin_slots([index + (value,) for index, value in wanted.items() if self.pinned.get(index) != value])
+
+    def pin_slots(self, slots):
+        # Lock (turma, day, hour, subject, value) slots on the live model by fixing the schedule variable
+        changed = []
+        for turma, day, hour, subject, value in slots:
+            var = self.model.vbSubjectSchedule[turma, day, hour, subject]
+            var.fix(value)
+            self.pinned[turma, day, hour, subject] = value
+            changed.append(var)
+        if self.session is not None:
+            self.session.update_variables(changed)
+
+    def unpin_slots(self, slots):
+        # Release (turma, day, hour, subject) slots pinned before
+        changed = []
+        for index in slots:
+            var = self.model.vbSubjectSchedule[index]
+            var.unfix()
+            self.pinned.pop(tuple(index), None)
+            changed.append(var)
+        if self.session is not None:
+            self.session.update_variables(changed)
+
+    def open_session(self, solver='appsi_highs'):
+        # Persistent solver that keeps the model loaded between solves. HiGHS warm starts from the
+        # previous incumbent, 'appsi_cbc' sessions solve cold every time
+        self.session = pyo.SolverFactory(solver)
+        # Only the changes are pushed on re-solve: the pinned slots by pin_slots/unpin_slots, the mutable pPreferences here
+        config = self.session.update_config
+        config.check_for_new_or_removed_constraints = False
+        config.check_for_new_or_removed_vars = False
+        config.check_for_new_or_removed_params = False
+        config.check_for_new_objective = False
+        config.update_constraints = False
+        config.update_vars = False
+        config.update_named_expressions = False
+        config.update_objective = False
+        config.update_params = True
+        self.session.set_instance(self.model)
+
+    def close_session(self):
+        self.session = None
+
+    def solve_schedule(self, solver=None, options=None):
+        # Solve the scheduling problem with any Pyomo solver ('cbc' by default, 'appsi_highs', 'gurobi', ...),
+        # options are passed to it as they are. With an open session its solver is used, with the options
+        if self.session is None:
+            opt = pyo.SolverFactory(solver or 'cbc')
+            res = opt.solve(self.model, options=options or {})
+        else:
+            if solver is not None:
+                raise ValueError(f"A session is open, close it to solve with {solver!r}")
+            # Warm start from the incumbent of the previous solve when the solver supports it
+            warm_start = getattr(self.session, 'warm_start_capable', lambda: False)()
+            res = self.session.solve(self.model, options=options or {}, warmstart=warm_start, load_solutions=False)
+            # Like the cold solve, an infeasible model is reported instead of raising
+            if len(res.solution) > 0:
+                self.model.solutions.load_from(res)
         print(res)
 
     def print_schedule(self):
@@ -2,6 +2,9 @@ from scheduler_model import course_scheduler
 import numpy as np 
 
 if __name__ == "__main__":
+    # Fixed seed so runs are reproducible
+    np.random.seed(0)
+
     # Args 
 
 
@@ -12,6 +12,7 @@ class course_scheduler:
         self.max_hours_per_day = max_hours_per_day
         self.model = None
         self.schedule = None
+        self.pinned = {}
         
     def create_model(self):
         # MODEL DEFINITION ----------------------------------------------------------
@@ -119,6 +120,7 @@ class course_scheduler:
 
         
         self.model = model
+        self.pinned = {}
         
     def update_preferences(self, preferences : list):
         #--------- preference constraints
@@ -126,19 +128,27 @@ class course_scheduler:
             self.model.pPreferences[k[0],k[1],k[2]]=k[3]
 
     def update_constraints(self, constraints : list):
-        self.model.ctFixedSlots = pyo.ConstraintList()
-        #--------- preference constraints
-        for k in constraints:
-            v = k[3]
-            if v==1:
-                self.model.ctFixedSlots.add(expr = self.model.vbSubjectSchedule[k[0],k[1],k[2]]==v)
-            else:
-                self.model.ctFixedSlots.add(expr = self.model.vbSubjectSchedule[k[0],k[1],k[2]]<=0)
-        
-    
-    def solve_schedule(self):
-        opt = pyo.SolverFactory('cbc')
-        res = opt.solve(self.model)
+        #--------- fixed slots, only the slots that changed are pinned or unpinned
+        wanted = {(k[0],k[1],k[2]): 1 if k[3]==1 else 0 for k in constraints}
+        self.unpin_slots([k for k in self.pinned if k not in wanted])
+        self.pin_slots([k + (v,) for k, v in wanted.items() if self.pinned.get(k)!=v])
+
+    def pin_slots(self, slots : list):
+        # Lock (day, hour, subject, value) slots on the live model by fixing the schedule variable
+        for k in slots:
+            self.model.vbSubjectSchedule[k[0],k[1],k[2]].fix(k[3])
+            self.pinned[k[0],k[1],k[2]] = k[3]
+
+    def unpin_slots(self, slots : list):
+        # Release (day, hour, subject) slots pinned before
+        for k in slots:
+            self.model.vbSubjectSchedule[k[0],k[1],k[2]].unfix()
+            self.pinned.pop((k[0],k[1],k[2]), None)
+
+    # Any Pyomo solver ('cbc', 'appsi_highs', 'gurobi', ...), options are passed to it as they are
+    def solve_schedule(self, solver='cbc', options=None):
+        opt = pyo.SolverFactory(solver)
+        res = opt.solve(self.model, options=options or {})
         print(res)
 
     def print_schedule(self):
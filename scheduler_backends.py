@@ -0,0 +1,155 @@
+import math
+
+import pyomo.environ as pyo
+from pyomo.core.base.label import NumericLabeler
+from pyomo.core.expr.symbol_map import SymbolMap
+from pyomo.opt import SolutionStatus, SolverResults, SolverStatus, TerminationCondition
+from pyomo.opt.results.solution import Solution
+from pyomo.repn import generate_standard_repn
+
+
+# Solver backends of course_scheduler._solve_model. A backend solves a built model without loading the
+# solution and returns Pyomo SolverResults, so the incumbent loading and cohort_result stay the same for
+# every solver. The scheduler limits arrive under their CBC names (seconds, ratioGap, maxNodes) and are
+# renamed per backend; workers and any other keyword options are passed to the solver as they are.
+class solver_backend:
+    name = None
+    # Scheduler limit -> solver parameter, limits the solver has no parameter for are left out
+    limits = {}
+    # Solver parameter of the number of threads
+    threads = None
+
+    def __init__(self, workers=None, **options):
+        self.workers = workers
+        self.options = options
+
+    def _options(self, limits):
+        options = {self.limits[key]: value for key, value in limits.items() if key in self.limits}
+        if self.workers and self.threads:
+            options[self.threads] = self.workers
+        options.update(self.options)
+        return options
+
+    def solve(self, model, limits, warmstart=False):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}(workers={self.workers!r}, options={self.options!r})"
+
+
+# Backends going through a Pyomo solver plugin
+class pyomo_backend(solver_backend):
+    solver = None
+
+    def solve(self, model, limits, warmstart=False):
+        solver = pyo.SolverFactory(self.solver)
+        return solver.solve(model, options=self._options(limits), load_solutions=False, warmstart=warmstart)
+
+
+class cbc_backend(pyomo_backend):
+    name = 'cbc'
+    solver = 'cbc'
+    limits = {'seconds': 'seconds', 'ratioGap': 'ratioGap', 'maxNodes': 'maxNodes'}
+    threads = 'threads'
+
+
+# HiGHS through highspy (Pyomo's appsi_highs plugin)
+class highs_backend(pyomo_backend):
+    name = 'highs'
+    solver = 'appsi_highs'
+    limits = {'seconds': 'time_limit', 'ratioGap': 'mip_rel_gap', 'maxNodes': 'mip_max_nodes'}
+    threads = 'threads'
+
+
+# OR-Tools CP-SAT on the same model: every variable becomes an integer variable over its bounds and every
+# active constraint a linear constraint, so all the timetable rules of the Pyomo model carry over (the
+# continuous 0-1 linking variables of the joint models only ever need 0 or 1). CP-SAT has no node limit.
+class cpsat_backend(solver_backend):
+    name = 'cpsat'
+    limits = {'seconds': 'max_time_in_seconds', 'ratioGap': 'relative_gap_limit'}
+    threads = 'num_workers'
+
+    def solve(self, model, limits, warmstart=False):
+        from ortools.sat.python import cp_model
+
+        cp = cp_model.CpModel()
+        columns = {}
+        for var in model.component_data_objects(pyo.Var, active=True, descend_into=True):
+            if var.fixed:
+                continue
+            lb, ub = var.bounds
+            if lb is None or ub is None:
+                raise ValueError(f"CP-SAT needs bounded variables, {var.name} is not")
+            columns[id(var)] = (var, cp.NewIntVar(math.ceil(lb), math.floor(ub), f"x{len(columns)}"))
+            if warmstart and var.value is not None:
+                cp.AddHint(columns[id(var)][1], int(round(var.value)))
+
+        for con in model.component_data_objects(pyo.Constraint, active=True, descend_into=True):
+            terms, coefs, constant = self._linear(con.body, columns)
+            if any(coef != int(coef) for coef in coefs):
+                raise ValueError(f"CP-SAT needs integer coefficients, {con.name} has {coefs}")
+            lb = cp_model.INT_MIN if con.lower is None else math.ceil(pyo.value(con.lower) - constant - 1e-9)
+            ub = cp_model.INT_MAX if con.upper is None else math.floor(pyo.value(con.upper) - constant + 1e-9)
+            cp.AddLinearConstraint(cp_model.LinearExpr.WeightedSum(terms, [int(coef) for coef in coefs]), lb, ub)
+
+        objectives = list(model.component_data_objects(pyo.Objective, active=True, descend_into=True))
+        if len(objectives) != 1:
+            raise ValueError(f"CP-SAT needs one active objective, the model has {len(objectives)}")
+        terms, coefs, constant = self._linear(objectives[0].expr, columns)
+        if all(coef == int(coef) for coef in coefs):
+            coefs = [int(coef) for coef in coefs]
+        maximize = objectives[0].sense == pyo.maximize
+        expr = cp_model.LinearExpr.WeightedSum(terms, coefs)
+        cp.Maximize(expr) if maximize else cp.Minimize(expr)
+
+        solver = cp_model.CpSolver()
+        for key, value in self._options(limits).items():
+            setattr(solver.parameters, key, value)
+        status = solver.Solve(cp)
+        if status == cp_model.MODEL_INVALID:
+            raise ValueError(f"CP-SAT rejected the model: {cp.Validate()}")
+
+        results = SolverResults()
+        results.solver.name = self.name
+        results.solver.wallclock_time = solver.WallTime()
+        results.solver.statistics.branch_and_bound.number_of_created_subproblems = solver.NumBranches()
+        if status == cp_model.OPTIMAL:
+            results.solver.status, results.solver.termination_condition = SolverStatus.ok, TerminationCondition.optimal
+        elif status == cp_model.INFEASIBLE:
+            results.solver.status, results.solver.termination_condition = SolverStatus.warning, TerminationCondition.infeasible
+        else:
+            # FEASIBLE or UNKNOWN: stopped by a limit, with or without a schedule
+            results.solver.status, results.solver.termination_condition = SolverStatus.aborted, TerminationCondition.maxTimeLimit
+
+        if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            value, bound = solver.ObjectiveValue() + constant, solver.BestObjectiveBound() + constant
+            results.problem.lower_bound, results.problem.upper_bound = (value, bound) if maximize else (bound, value)
+            # The values travel by symbol like the solver plugins', model.solutions.load_from reads them
+            symbols, labeler = SymbolMap(), NumericLabeler('x')
+            solution = Solution()
+            solution.status = SolutionStatus.optimal if status == cp_model.OPTIMAL else SolutionStatus.feasible
+            for var, column in columns.values():
+                solution.variable[symbols.getSymbol(var, labeler)] = {'Value': float(solver.Value(column))}
+            results.solution.insert(solution)
+            results._smap = symbols
+        return results
+
+    # CP-SAT columns, coefficients and constant of a linear Pyomo expression, fixed variables and
+    # mutable parameters taken at their current values
+    @staticmethod
+    def _linear(expr, columns):
+        repn = generate_standard_repn(expr, quadratic=False)
+        if not repn.is_linear():
+            raise ValueError(f"CP-SAT needs linear expressions, got {expr}")
+        terms = [columns[id(var)][1] for var in repn.linear_vars]
+        return terms, [float(coef) for coef in repn.linear_coefs], float(repn.constant)
+
+
+BACKENDS = {backend.name: backend for backend in (cbc_backend, highs_backend, cpsat_backend)}
+
+
+# Backend by name, e.g. make_backend('cpsat', workers=8, log_search_progress=True)
+def make_backend(name, workers=None, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](workers, **options)
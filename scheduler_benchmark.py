@@ -0,0 +1,190 @@
+import argparse
+import csv
+import json
+import time
+
+import numpy as np
+
+from scheduler_backends import BACKENDS
+from scheduler_model import course_scheduler
+import scheduler_matrix
+
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+# Synthetic institution with the same input structures the CSV readers produce, fully determined by seed
+def generate_instance(seed=0, cohorts=4, subjects_per_cohort=5, rooms=8, teachers=15, days=5, hours=9,
+                      availability=0.6, teachers_per_subject=3, rooms_per_subject=2, preference_rate=0.7,
+                      class_size=20, weekly_hours=(2, 4, 6)):
+    rng = np.random.default_rng(seed)
+    day_names = DAY_NAMES[:days] if days <= len(DAY_NAMES) else [f"Day {d + 1}" for d in range(days)]
+    hour_grid = list(range(9, 9 + hours))
+
+    room_names = [f"sala{r + 1}" for r in range(rooms)]
+    salas = {room: int(size) for room, size in zip(room_names, rng.integers(class_size - 5, 2 * class_size, rooms))}
+    # The model falls back to the temporary room when no preferred room is big enough
+    salas["Temp Room"] = 10 * class_size
+
+    teacher_names = [f"Teacher {t + 1}" for t in range(teachers)]
+    preferencas_dias_professores = {}
+    for teacher in teacher_names:
+        available = rng.random(days) < availability
+        # Every teacher is available at least one day
+        available[rng.integers(days)] = True
+        preferencas_dias_professores[teacher] = [day for day, a in zip(day_names, available) if a]
+
+    courses_overall = {}
+    teachers_Subject = {}
+    discPreferenciasSala = {}
+    for c in range(cohorts):
+        courses = {}
+        for s in range(subjects_per_cohort):
+            subject = f"Subject {c + 1}.{s + 1}"
+            courses[subject] = int(rng.choice(weekly_hours))
+            teachers_Subject[subject] = list(rng.choice(teacher_names, min(teachers_per_subject, teachers), replace=False))
+            if rng.random() < preference_rate:
+                discPreferenciasSala[subject] = list(rng.choice(room_names, min(rooms_per_subject, rooms), replace=False))
+            else:
+                discPreferenciasSala[subject] = []
+        courses_overall[f"Cohort {c + 1}"] = courses
+
+    # One teacher per subject, drawn with the same generator
+    teachers_chosen = {subject: str(rng.choice(teachers)) for subject, teachers in teachers_Subject.items()}
+    quantity_students = [int(q) for q in rng.integers(class_size - 5, class_size + 5, cohorts)]
+
+    return {
+        'days': day_names,
+        'hours': hour_grid,
+        'courses_overall': courses_overall,
+        'max_hours_per_day': 8,
+        'teachers_Subject': {subject: [str(t) for t in teachers] for subject, teachers in teachers_Subject.items()},
+        'teachers_chosen': teachers_chosen,
+        'preferencas_dias_professores': preferencas_dias_professores,
+        'salas': salas,
+        'discPreferenciasSala': {subject: [str(r) for r in rooms] for subject, rooms in discPreferenciasSala.items()},
+        'quantity_students': quantity_students,
+    }
+
+
+def make_scheduler(instance):
+    return course_scheduler(instance['days'], instance['hours'], instance['courses_overall'],
+                            instance['max_hours_per_day'], instance['teachers_chosen'],
+                            instance['preferencas_dias_professores'], instance['salas'],
+                            instance['discPreferenciasSala'], instance['quantity_students'])
+
+
+# Each variant returns {phase: seconds} and the model sizes for one run over all cohorts
+
+def _run_pyomo(scheduler, solve):
+    timings = {}
+    start = time.perf_counter()
+    scheduler.create_model()
+    timings['create_model'] = time.perf_counter() - start
+    if solve:
+        start = time.perf_counter()
+        for model in scheduler.models:
+            scheduler._solve_model(model)
+        timings['solve'] = time.perf_counter() - start
+        start = time.perf_counter()
+        scheduler.extract_solutions()
+        timings['extract'] = time.perf_counter() - start
+    timings['variables'] = sum(model.nvariables() for model in scheduler.models)
+    timings['constraints'] = sum(model.nconstraints() for model in scheduler.models)
+    return timings
+
+
+def _run_daily(scheduler, solve):
+    # Same as pyomo with one room variable per (day, course)
+    scheduler.room_formulation = 'daily'
+    return _run_pyomo(scheduler, solve)
+
+
+def _run_parallel(scheduler, solve):
+    # Build and solve happen together in the workers
+    if not solve:
+        return {}
+    start = time.perf_counter()
+    scheduler.solve_parallel()
+    return {'create_model+solve': time.perf_counter() - start}
+
+
+def _run_matrix(scheduler, solve):
+    timings = {}
+    start = time.perf_counter()
+    matrix_models = [scheduler_matrix.build_matrix_model(scheduler, idx, courses)
+                     for idx, courses in enumerate(scheduler.courses_overall.values())]
+    timings['create_model'] = time.perf_counter() - start
+    if solve:
+        start = time.perf_counter()
+        results = [scheduler_matrix.solve_matrix_model(mm) for mm in matrix_models]
+        timings['solve'] = time.perf_counter() - start
+        start = time.perf_counter()
+        for mm, result in zip(matrix_models, results):
+            if result.x is not None:
+                scheduler_matrix.decode_solution(mm, result.x)
+        timings['extract'] = time.perf_counter() - start
+    timings['variables'] = sum(mm.n_columns for mm in matrix_models)
+    timings['constraints'] = sum(mm.n_rows for mm in matrix_models)
+    return timings
+
+
+VARIANTS = {
+    'pyomo': _run_pyomo,
+    'daily': _run_daily,
+    'parallel': _run_parallel,
+    'matrix': _run_matrix,
+}
+
+
+# Time every variant on every instance size, one report row per (size, variant, repeat)
+# backend is the solver of the Pyomo variants (the matrix variant always uses HiGHS through scipy)
+def run_benchmark(sizes, variants=('pyomo', 'daily', 'matrix'), seed=0, repeats=1, solve=True, backend='cbc'):
+    rows = []
+    for size in sizes:
+        instance = generate_instance(seed=seed, **size)
+        for variant in variants:
+            for repeat in range(repeats):
+                scheduler = make_scheduler(instance)
+                scheduler.set_backend(backend)
+                timings = VARIANTS[variant](scheduler, solve)
+                row = {'variant': variant, 'backend': backend, 'repeat': repeat, 'seed': seed}
+                row.update(size)
+                row.update(timings)
+                rows.append(row)
+                print(row)
+    return rows
+
+
+# JSON or CSV report depending on the file extension
+def write_report(rows, path):
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(rows, f, indent=2)
+    else:
+        fields = list(dict.fromkeys(key for row in rows for key in row))
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+DEFAULT_SIZES = [
+    {'cohorts': 4, 'subjects_per_cohort': 5, 'rooms': 8, 'teachers': 15},
+    {'cohorts': 10, 'subjects_per_cohort': 6, 'rooms': 15, 'teachers': 30},
+    {'cohorts': 40, 'subjects_per_cohort': 6, 'rooms': 30, 'teachers': 80},
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the scheduler variants on synthetic institutions")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--variants', nargs='+', default=['pyomo', 'daily', 'matrix'], choices=sorted(VARIANTS))
+    parser.add_argument('--backend', default='cbc', choices=sorted(BACKENDS))
+    parser.add_argument('--no-solve', action='store_true', help="only time the model build")
+    parser.add_argument('--output', default='benchmark.json', help="report file, .json or .csv")
+    args = parser.parse_args()
+
+    report = run_benchmark(DEFAULT_SIZES, args.variants, args.seed, args.repeats, not args.no_solve, args.backend)
+    write_report(report, args.output)
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import shlex
+
+import numpy as np
+
+from scheduler_matrix import build_matrix_model, decode_solution, matrix_model
+from scheduler_model import cohort_result
+
+
+# Offline solve bundles: every cohort model written straight from its matrix_model as an LP or MPS file,
+# with the index arrays needed to decode it, a manifest and a run.sh solving the cohorts with plain cbc.
+# Columns are named c<column> and rows r<row>, so a .sol file maps back without the Pyomo model.
+
+MANIFEST = 'manifest.json'
+RUN_SCRIPT = 'run.sh'
+
+# cbc statuses whose values are no integer schedule
+NO_SOLUTION = ('Infeasible', 'Integer infeasible', 'Unbounded', 'no integer solution')
+
+
+def _number(value):
+    return f"{value:.12g}"
+
+
+# Linear expression over the columns, a few terms per line to stay below the LP line length limits
+def _terms(columns, coefs):
+    terms = [f"{'-' if coef < 0 else '+'} {_number(abs(coef))} c{col}" for col, coef in zip(columns, coefs)]
+    return '\n   '.join(' '.join(terms[i:i + 8]) for i in range(0, len(terms), 8)) or '0 c0'
+
+
+# CPLEX LP file of a matrix model, maximising the weekly hours objective over binary columns
+def write_lp(mm, path):
+    A = mm.A.tocsr()
+    objective = np.flatnonzero(mm.objective)
+    with open(path, 'w') as f:
+        f.write("Maximize\n obj: " + _terms(objective, mm.objective[objective]) + "\nSubject To\n")
+        for row in range(mm.n_rows):
+            start, end = A.indptr[row], A.indptr[row + 1]
+            body = _terms(A.indices[start:end], A.data[start:end])
+            lb, ub = mm.row_lb[row], mm.row_ub[row]
+            if lb == ub:
+                f.write(f" r{row}: {body} = {_number(ub)}\n")
+                continue
+            if np.isfinite(ub):
+                f.write(f" r{row}: {body} <= {_number(ub)}\n")
+            if np.isfinite(lb):
+                f.write(f" r{row}_lb: {body} >= {_number(lb)}\n")
+        f.write("Binaries\n")
+        for start in range(0, mm.n_columns, 10):
+            f.write(' ' + ' '.join(f"c{col}" for col in range(start, min(start + 10, mm.n_columns))) + '\n')
+        f.write("End\n")
+
+
+# Free MPS file of a matrix model. MPS has no objective sense everywhere, so the objective is negated
+# and minimised; read_solution recomputes the objective from the column values.
+def write_mps(mm, path):
+    A = mm.A.tocsc()
+    with open(path, 'w') as f:
+        f.write("NAME cohort\nROWS\n N obj\n")
+        kinds = []
+        for row in range(mm.n_rows):
+            lb, ub = mm.row_lb[row], mm.row_ub[row]
+            kind = 'E' if lb == ub else 'L' if np.isfinite(ub) else 'G'
+            kinds.append(kind)
+            f.write(f" {kind} r{row}\n")
+        f.write("COLUMNS\n    MARKER 'MARKER' 'INTORG'\n")
+        for col in range(mm.n_columns):
+            if mm.objective[col]:
+                f.write(f"    c{col} obj {_number(-mm.objective[col])}\n")
+            for k in range(A.indptr[col], A.indptr[col + 1]):
+                f.write(f"    c{col} r{A.indices[k]} {_number(A.data[k])}\n")
+        f.write("    MARKER 'MARKER' 'INTEND'\nRHS\n")
+        for row, kind in enumerate(kinds):
+            rhs = mm.row_lb[row] if kind == 'G' else mm.row_ub[row]
+            if rhs:
+                f.write(f"    rhs r{row} {_number(rhs)}\n")
+        ranged = [row for row, kind in enumerate(kinds)
+                  if kind != 'E' and np.isfinite(mm.row_lb[row]) and np.isfinite(mm.row_ub[row])]
+        if ranged:
+            f.write("RANGES\n")
+            for row in ranged:
+                f.write(f"    rng r{row} {_number(mm.row_ub[row] - mm.row_lb[row])}\n")
+        f.write("BOUNDS\n")
+        for col in range(mm.n_columns):
+            f.write(f" UP bnd c{col} 1\n")
+        f.write("ENDATA\n")
+
+
+# cbc command line options of the scheduler limits, the total time limit is left to the batch box
+def _cbc_options(scheduler):
+    options = {}
+    if scheduler.time_limit is not None:
+        options['seconds'] = scheduler.time_limit
+    if scheduler.gap is not None:
+        options['ratioGap'] = scheduler.gap
+    if scheduler.node_limit is not None:
+        options['maxNodes'] = scheduler.node_limit
+    return options
+
+
+# Write every cohort of the scheduler into directory: cohort_<idx>.<fmt> models, cohort_<idx>.npz index
+# arrays, the manifest and run.sh. Returns the manifest.
+def export_bundle(scheduler, directory, fmt='mps'):
+    if fmt not in ('lp', 'mps'):
+        raise ValueError(f"Unknown model format {fmt!r}")
+    if scheduler.room_formulation != 'hourly':
+        raise ValueError("Bundles are written from the matrix model, which only has the hourly room formulation")
+    os.makedirs(directory, exist_ok=True)
+    options = _cbc_options(scheduler)
+    cohorts = []
+    for idx, (name, courses) in enumerate(scheduler.courses_overall.items()):
+        mm = build_matrix_model(scheduler, idx, courses)
+        files = {'model': f"cohort_{idx}.{fmt}", 'index': f"cohort_{idx}.npz", 'solution': f"cohort_{idx}.sol"}
+        (write_lp if fmt == 'lp' else write_mps)(mm, os.path.join(directory, files['model']))
+        np.savez_compressed(os.path.join(directory, files['index']), slot_day=mm.slot_day, slot_hour=mm.slot_hour,
+                            slot_course=mm.slot_course, room_slot=mm.room_slot, room_room=mm.room_room,
+                            objective=mm.objective)
+        cohorts.append(dict(files, cohort=idx, name=str(name), courses=mm.courses,
+                            columns=mm.n_columns, rows=mm.n_rows, nonzeros=int(mm.A.nnz)))
+
+    # The teacher of every course, the cohort models were built against their available days
+    teachers = {course: scheduler.teachers_Subject.get(course) for cohort in cohorts for course in cohort['courses']}
+    manifest = {'format': fmt, 'days': list(scheduler.days), 'hours': list(scheduler.hours),
+                'rooms': list(scheduler.salas), 'room_formulation': scheduler.room_formulation,
+                'cbc_options': options, 'teachers': teachers, 'cohorts': cohorts}
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, default=str)
+
+    flags = [f"-{key} {shlex.quote(str(value))}" for key, value in options.items()]
+    with open(os.path.join(directory, RUN_SCRIPT), 'w') as f:
+        f.write("#!/bin/sh\n# Solve every cohort of the bundle with cbc, writing the .sol files next to the models\n")
+        f.write('cd "$(dirname "$0")" || exit 1\nCBC="${CBC:-cbc}"\n')
+        for cohort in cohorts:
+            f.write(' '.join(['"$CBC"', cohort['model']] + flags + ['solve', 'solu', cohort['solution']]) + '\n')
+    os.chmod(os.path.join(directory, RUN_SCRIPT), 0o755)
+    print(f"Wrote {len(cohorts)} cohort models to {directory}")
+    return manifest
+
+
+# Status, objective line value and column values of a cbc .sol file over n_columns columns
+def read_solution(path, n_columns):
+    with open(path) as f:
+        status, _, objective = f.readline().strip().rpartition(' - objective value ')
+        values = np.zeros(n_columns)
+        for line in f:
+            parts = line.split()
+            # Lines of infeasible rows start with '**'
+            if len(parts) >= 3 and parts[0] != '**' and parts[1].startswith('c'):
+                values[int(parts[1][1:])] = float(parts[2])
+    if any(word in status for word in NO_SOLUTION):
+        values[:] = 0
+    return status, float(objective), values
+
+
+# ValueError unless the scheduler has the cohorts, courses and teachers the bundle was exported with
+def _check_scheduler(manifest, scheduler):
+    cohorts = [(cohort['name'], cohort['courses']) for cohort in manifest['cohorts']]
+    expected = [(str(name), list(courses)) for name, courses in scheduler.courses_overall.items()]
+    if cohorts != expected:
+        raise ValueError("The scheduler cohorts or courses differ from the bundle's")
+    teachers = {course: scheduler.teachers_Subject.get(course) for course in manifest['teachers']}
+    changed = {course: (teacher, teachers[course]) for course, teacher in manifest['teachers'].items()
+               if teachers[course] != teacher}
+    if changed:
+        raise ValueError(f"The scheduler teachers differ from the bundle's (bundle, scheduler): {changed}")
+
+
+# cohort_solutions and cohort_results of a bundle solved with its run.sh. Cohorts without a .sol file
+# get status 'missing' and an empty schedule. With a scheduler they become its solutions and results,
+# ready for print_schedule and print_and_export_schedule; its cohorts, courses and teachers must be the
+# ones the bundle was exported with.
+def import_bundle(directory, scheduler=None):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if scheduler is not None:
+        _check_scheduler(manifest, scheduler)
+    solutions, results = [], []
+    for cohort in manifest['cohorts']:
+        with np.load(os.path.join(directory, cohort['index'])) as index:
+            mm = matrix_model(manifest['days'], manifest['hours'], cohort['courses'], manifest['rooms'],
+                              index['slot_day'], index['slot_hour'], index['slot_course'],
+                              index['room_slot'], index['room_room'], index['objective'], None, None, None, {})
+        path = os.path.join(directory, cohort['solution'])
+        if os.path.exists(path):
+            status, _, values = read_solution(path, cohort['columns'])
+        else:
+            status, values = 'missing', np.zeros(cohort['columns'])
+        solved = not any(word in status for word in NO_SOLUTION) and status != 'missing'
+        solution = decode_solution(mm, values)
+        solution.suboptimal = status != 'Optimal'
+        solutions.append(solution)
+        results.append(cohort_result(cohort['cohort'], status, float(mm.objective @ values) if solved else None,
+                                     suboptimal=solution.suboptimal))
+    if scheduler is not None:
+        scheduler.solutions = solutions
+        scheduler.results = results
+    for result in results:
+        print(result)
+    return solutions, results
+
+
+if __name__ == "__main__":
+    from scheduler_io import load_inputs
+    from scheduler_model import course_scheduler
+    from scheduler_teachers import course_hours
+    from test_scheduler import assign_teachers_to_courses
+
+    parser = argparse.ArgumentParser(description="Write the cohort models as an offline cbc bundle, or read a solved one back")
+    parser.add_argument('action', choices=['export', 'import'])
+    parser.add_argument('directory')
+    parser.add_argument('--format', choices=['lp', 'mps'], default='mps')
+    parser.add_argument('--time-limit', type=float, default=None)
+    args = parser.parse_args()
+
+    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    hours = [9, 10, 11, 12, 13, 14, 15, 16, 17]
+    inputs = load_inputs(".", days)
+    # The same teachers test_scheduler.py chooses, which reads the bundle back
+    teachers_chosen = assign_teachers_to_courses(inputs.teachers_Subject(), inputs.preferencas_dias_professores(),
+                                                 course_hours(inputs.courses_overall()))
+    scheduler = course_scheduler(days, hours, inputs.courses_overall(), 8, teachers_chosen,
+                                 inputs.preferencas_dias_professores(), inputs.salas(),
+                                 inputs.discPreferenciasSala(), [20, 20, 22, 20])
+    if args.action == 'export':
+        scheduler.set_limits(time_limit=args.time_limit)
+        export_bundle(scheduler, args.directory, args.format)
+    else:
+        import_bundle(args.directory, scheduler)
+        scheduler.print_schedule()
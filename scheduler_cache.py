@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from scheduler_model import cohort_solution
+
+
+# On-disk cohort solutions keyed by a hash of everything the cohort model is built from.
+# Entries are .npz files; reading one refreshes its mtime, and the least recently used
+# entries are evicted once the directory grows past max_bytes.
+class solution_cache:
+    def __init__(self, directory='.schedule_cache', max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    # Hash of the normalised inputs of one cohort, the solver options and the random seed
+    def key(self, scheduler, idx, courses, solver_options=None, seed=None):
+        teachers = {course: scheduler.teachers_Subject.get(course) for course in courses}
+        rooms = scheduler._suitable_rooms(courses, scheduler.quantity_students[idx])
+        inputs = {
+            'days': list(scheduler.days),
+            'hours': list(scheduler.hours),
+            'courses': sorted(courses.items()),
+            'max_hours_per_day': scheduler.max_hours_per_day,
+            'quantity_students': scheduler.quantity_students[idx],
+            'teachers': sorted(teachers.items(), key=str),
+            'teacher_days': {str(teacher): sorted(scheduler.preferencas_dias_professores.get(teacher, []))
+                             for teacher in teachers.values()},
+            'rooms': {course: [(room, scheduler.salas[room]) for room in rooms[course]] for course in sorted(rooms)},
+            'room_formulation': scheduler.room_formulation,
+            'solver_options': solver_options or {},
+            'seed': seed,
+        }
+        normalised = json.dumps(inputs, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(normalised.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            solution = cohort_solution(meta['days'], meta['hours'], meta['courses'], meta['rooms'],
+                                       data['schedule'], data['room'])
+        os.utime(path)
+        return solution
+
+    def put(self, key, solution):
+        meta = json.dumps({'days': solution.days, 'hours': solution.hours,
+                           'courses': solution.courses, 'rooms': solution.rooms}, ensure_ascii=False)
+        # Write then rename so a concurrent reader never sees a partial entry
+        tmp = os.path.join(self.directory, key + '.tmp.npz')
+        np.savez_compressed(tmp, schedule=solution.schedule, room=solution.room, meta=np.array(meta))
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    # Drop least recently used entries until the cache fits in max_bytes
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, name))
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,107 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyomo.environ as pyo
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from scheduler_model import TEMP_ROOM, cohort_result, extract_solution
+
+
+# Cohort - teacher - room graph of the inputs: a cohort is linked to the teacher of every course and to
+# every room its courses may use (the temporary room excepted, it never runs out).
+# Nodes are the cohorts, then the teachers, then the rooms; returns the adjacency matrix and the node names.
+def resource_graph(scheduler):
+    cohorts = list(range(len(scheduler.courses_overall)))
+    teachers, rooms = {}, {}
+    edges = []
+    for idx, courses in enumerate(scheduler.courses_overall.values()):
+        for course, suitable in scheduler._suitable_rooms(courses, scheduler.quantity_students[idx]).items():
+            teacher = scheduler.teachers_Subject.get(course)
+            if teacher is not None:
+                edges.append((idx, ('teacher', teachers.setdefault(teacher, len(teachers)))))
+            for room in suitable:
+                if room != TEMP_ROOM:
+                    edges.append((idx, ('room', rooms.setdefault(room, len(rooms)))))
+
+    offset = {'teacher': len(cohorts), 'room': len(cohorts) + len(teachers)}
+    n = len(cohorts) + len(teachers) + len(rooms)
+    rows = np.array([idx for idx, _ in edges], dtype=int)
+    cols = np.array([offset[kind] + i for _, (kind, i) in edges], dtype=int)
+    graph = sparse.coo_matrix((np.ones(len(edges)), (rows, cols)), shape=(n, n)).tocsr()
+    names = cohorts + [('teacher', teacher) for teacher in teachers] + [('room', room) for room in rooms]
+    return graph, names
+
+
+# Cohort indices of every connected component of the resource graph, cohorts sharing no teacher or room
+# (directly or through other cohorts) end up in different components
+def components(scheduler):
+    graph, _ = resource_graph(scheduler)
+    _, labels = connected_components(graph, directed=False)
+    n_cohorts = len(scheduler.courses_overall)
+    groups = {}
+    for idx in range(n_cohorts):
+        groups.setdefault(labels[idx], []).append(idx)
+    return list(groups.values())
+
+
+# Worker entry point: a one-cohort component is the plain cohort model, larger ones a joint model
+def _build_and_solve_component(scheduler, cohorts):
+    if len(cohorts) == 1:
+        model = scheduler._build_model(cohorts[0], list(scheduler.courses_overall.values())[cohorts[0]])
+    else:
+        model = scheduler._build_joint_model(cohorts)
+    scheduler._solve_model(model)
+    return model
+
+
+# Solve every component as its own model in a process pool. Cohorts of a component are solved jointly, so
+# their shared rooms and teachers never clash; independent cohorts do not enlarge each other's MIP.
+def solve_components(scheduler, workers=None):
+    scheduler._start_clock()
+    groups = components(scheduler)
+    print(f"{len(groups)} components: {groups}")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_build_and_solve_component, scheduler, cohorts) for cohorts in groups]
+        models = [future.result() for future in futures]
+
+    solutions, results = {}, {}
+    for cohorts, model in zip(groups, models):
+        _collect(cohorts, model, solutions, results)
+    return _finish(scheduler, models, solutions, results)
+
+
+# Every cohort in one joint model, rooms and teachers shared by any two cohorts are never double booked
+def solve_joint(scheduler):
+    scheduler._start_clock()
+    cohorts = list(range(len(scheduler.courses_overall)))
+    model = scheduler._build_joint_model(cohorts)
+    scheduler._solve_model(model)
+    solutions, results = {}, {}
+    _collect(cohorts, model, solutions, results)
+    return _finish(scheduler, [model], solutions, results)
+
+
+# Solutions and results of the cohorts of a solved component model
+def _collect(cohorts, model, solutions, results):
+    if len(cohorts) == 1 and not hasattr(model, 'cohort_models'):
+        solutions[cohorts[0]] = extract_solution(model)
+        results[cohorts[0]] = model.result
+        return
+    # The joint result holds for the whole component, every cohort reports its own objective
+    for idx in cohorts:
+        block = model.cohort_models[idx]
+        block.suboptimal = model.suboptimal
+        solutions[idx] = extract_solution(block)
+        objective = pyo.value(block.objective.expr, exception=False)
+        results[idx] = cohort_result(idx, model.result.status, objective, seconds=model.result.seconds,
+                                     nodes=model.result.nodes, suboptimal=model.suboptimal)
+
+
+def _finish(scheduler, models, solutions, results):
+    scheduler.models = models
+    scheduler.solutions = [solutions[idx] for idx in range(len(scheduler.courses_overall))]
+    scheduler.results = [results[idx] for idx in range(len(scheduler.courses_overall))]
+    for result in scheduler.results:
+        print(result)
+    return scheduler.results
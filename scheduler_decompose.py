@@ -0,0 +1,118 @@
+import numpy as np
+import pyomo.environ as pyo
+from scipy.optimize import linear_sum_assignment
+
+from scheduler_model import TEMP_ROOM, extract_solution
+
+
+# Cost of a room a class may not use
+UNSUITABLE = 1e6
+
+
+# Two-phase solve, cohort by cohort.
+# Phase 1 solves the cohort model without room variables, keeping out of the slots where every suitable
+# room of the course is already held by the earlier cohorts (the room capacity left in the slot).
+# Phase 2 gives every class a room with assign_rooms. A class left without a suitable room free for its
+# whole block becomes a cut forbidding that course at that hour, and phase 1 is solved again, until every
+# class has a room or max_rounds re-solves are spent. The rooms then count as held for the next cohorts.
+def solve_two_phase(scheduler, max_rounds=20):
+    scheduler._start_clock()
+    rooms = list(scheduler.salas)
+    occupied = np.zeros((len(scheduler.days), len(scheduler.hours), len(rooms)), dtype=bool)
+    models, solutions = [], []
+    for idx, courses in enumerate(scheduler.courses_overall.values()):
+        suitable = scheduler._suitable_rooms(courses, scheduler.quantity_students[idx])
+        mask = np.stack([~occupied[:, :, [rooms.index(room) for room in suitable[course]]].all(axis=2)
+                         for course in courses], axis=2)
+        model = scheduler._build_model(idx, courses, room_formulation='none', mask=mask)
+        model.cuts = pyo.ConstraintList()
+        scheduler._solve_model(model)
+        print(model.result)
+
+        # Every solve, the last one included, is matched, so the kept solution is the one of the model
+        for round in range(max_rounds + 1):
+            solution = extract_solution(model)
+            held = occupied.copy()
+            failed = assign_rooms(scheduler, [solution], held, [idx])
+            if not failed:
+                break
+            if round == max_rounds:
+                print(f"Cohort {idx}: rooms still missing for {len(failed)} classes after {max_rounds} rounds")
+                break
+            print(f"Cohort {idx}: no free room for {len(failed)} classes, solving again")
+            for _, d, h, c in failed:
+                model.cuts.add(model.schedule[solution.days[d], solution.hours[h], solution.courses[c]] <= 0)
+            scheduler._solve_model(model)
+
+        occupied = held
+        models.append(model)
+        solutions.append(solution)
+
+    scheduler.models = models
+    scheduler.solutions = solutions
+    scheduler.results = [model.result for model in models]
+    return solutions
+
+
+# Phase 2: fill the room arrays of phase 1 solutions in place, marking the rooms taken in occupied
+# (day x hour x room). Hour by hour, a class continuing from the previous hour keeps its room and the
+# classes starting at the hour are matched with linear_sum_assignment to rooms free for their whole
+# block, preferring the course's preferred rooms in order and then the tightest fit.
+# cohorts are the cohort indices of the solutions. Returns (cohort, day, hour, course) of the classes
+# that found no suitable free room.
+def assign_rooms(scheduler, solutions, occupied, cohorts=None):
+    cohorts = cohorts if cohorts is not None else range(len(solutions))
+    rooms = list(scheduler.salas)
+    size = np.array([scheduler.salas[room] for room in rooms], dtype=float)
+    costs = [_room_costs(scheduler, idx, solution, rooms, size) for idx, solution in zip(cohorts, solutions)]
+    failed = []
+    for solution in solutions:
+        solution.room[:] = -1
+
+    n_hours = len(scheduler.hours)
+    for d in range(len(scheduler.days)):
+        for h in range(n_hours):
+            starting = []
+            for k, solution in enumerate(solutions):
+                for c in np.flatnonzero(solution.schedule[d, h]):
+                    previous = solution.room[d, h - 1, c] if h > 0 and solution.schedule[d, h - 1, c] else -1
+                    if previous >= 0:
+                        solution.room[d, h, c] = previous
+                    else:
+                        starting.append((k, c))
+            if not starting:
+                continue
+            cost = np.empty((len(starting), len(rooms)))
+            ends = []
+            for row, (k, c) in enumerate(starting):
+                end = h + 1
+                while end < n_hours and solutions[k].schedule[d, end, c]:
+                    end += 1
+                ends.append(end)
+                cost[row] = np.where(occupied[d, h:end].any(axis=0), UNSUITABLE, costs[k][c])
+            rows, cols = linear_sum_assignment(cost)
+            matched = dict(zip(rows, cols))
+            for row, (k, c) in enumerate(starting):
+                col = matched.get(row)
+                if col is None or cost[row, col] >= UNSUITABLE:
+                    failed.append((cohorts[k], d, h, c))
+                else:
+                    solutions[k].room[d, h, c] = col
+                    # The temporary room is never held, any number of classes share it
+                    if rooms[col] != TEMP_ROOM:
+                        occupied[d, h:ends[row], col] = True
+    return failed
+
+
+# Course x room matching cost of a cohort: preference rank plus a tightness term below 1, UNSUITABLE
+# outside the rooms the cohort model would allow
+def _room_costs(scheduler, idx, solution, rooms, size):
+    students = scheduler.quantity_students[idx]
+    fit = np.abs(size - students) / (size.max() + 1)
+    suitable = scheduler._suitable_rooms(solution.courses, students)
+    cost = np.full((len(solution.courses), len(rooms)), UNSUITABLE)
+    for c, course in enumerate(solution.courses):
+        for rank, room in enumerate(suitable[course]):
+            r = rooms.index(room)
+            cost[c, r] = rank + fit[r]
+    return cost
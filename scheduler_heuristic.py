@@ -0,0 +1,28 @@
+import numpy as np
+
+
+# Constructive schedule of one cohort. Courses in decreasing objective weight take their weekly hours as
+# two-hour blocks, at most one block a day (the model allows two hours of a course per day and no lone
+# hours), each in the first free pair of consecutive hours of the least loaded day their teacher is available.
+# available is the course x day x hour mask the model is built from, returns a day x hour x course schedule.
+def greedy_blocks(available, weekly_hours, weights):
+    n_courses, n_days, n_hours = available.shape
+    schedule = np.zeros((n_days, n_hours, n_courses), dtype=bool)
+    busy = np.zeros((n_days, n_hours), dtype=bool)
+    for c in sorted(range(n_courses), key=lambda c: (-weights[c], c)):
+        blocks = int(weekly_hours[c]) // 2
+        used_days = np.zeros(n_days, dtype=bool)
+        while blocks > 0:
+            free = available[c] & ~busy
+            # Free pairs of consecutive hours of every day
+            pairs = free[:, :-1] & free[:, 1:]
+            candidates = np.flatnonzero(pairs.any(axis=1) & ~used_days)
+            if len(candidates) == 0:
+                break
+            d = candidates[np.argmin(busy[candidates].sum(axis=1))]
+            h = np.flatnonzero(pairs[d])[0]
+            schedule[d, h:h + 2, c] = True
+            busy[d, h:h + 2] = True
+            used_days[d] = True
+            blocks -= 1
+    return schedule
@@ -0,0 +1,94 @@
+import numpy as np
+
+from scheduler_model import TEMP_ROOM
+
+
+# Inverted room and teacher occupancy of a solved course_scheduler, built once from its cohort solutions.
+# Lookups by (room, day, hour) and (teacher, day, hour) are dictionary hits; the load tensors
+# (resource x day x hour occupant counts) answer conflict queries with array operations. The temporary
+# room holds any number of classes, so it is listed with its occupants but never in conflict.
+class occupancy_index:
+    def __init__(self, scheduler):
+        self.days = list(scheduler.days)
+        self.hours = list(scheduler.hours)
+        self.cohorts = list(scheduler.courses_overall)
+        self.rooms = list(scheduler.salas)
+        self.teachers = sorted({teacher for teacher in scheduler.teachers_Subject.values() if teacher is not None})
+
+        self.day_code = {day: d for d, day in enumerate(self.days)}
+        self.hour_code = {hour: h for h, hour in enumerate(self.hours)}
+        self.room_code = {room: r for r, room in enumerate(self.rooms)}
+        self.teacher_code = {teacher: t for t, teacher in enumerate(self.teachers)}
+
+        shape = (len(self.days), len(self.hours))
+        self.room_load = np.zeros((len(self.rooms),) + shape, dtype=np.int32)
+        self.teacher_load = np.zeros((len(self.teachers),) + shape, dtype=np.int32)
+        self.by_room = {}
+        self.by_teacher = {}
+
+        for cohort, solution in zip(self.cohorts, scheduler._solved()):
+            d, h, c = np.nonzero(solution.schedule)
+            local_room = solution.room[d, h, c]
+            # Solution codes are local to the cohort model, map them onto the index codes
+            room_map = np.array([self.room_code.get(room, -1) for room in solution.rooms] + [-1])
+            teacher_map = np.array([self.teacher_code.get(scheduler.teachers_Subject.get(course), -1)
+                                    for course in solution.courses] + [-1])
+            r = room_map[local_room]
+            t = teacher_map[c]
+
+            has_room = r >= 0
+            np.add.at(self.room_load, (r[has_room], d[has_room], h[has_room]), 1)
+            has_teacher = t >= 0
+            np.add.at(self.teacher_load, (t[has_teacher], d[has_teacher], h[has_teacher]), 1)
+
+            for di, hi, ci, ri, ti in zip(d, h, c, r, t):
+                occupant = (cohort, solution.courses[ci])
+                key = (self.days[di], self.hours[hi])
+                if ri >= 0:
+                    self.by_room.setdefault((self.rooms[ri],) + key, []).append(occupant)
+                if ti >= 0:
+                    self.by_teacher.setdefault((self.teachers[ti],) + key, []).append(occupant)
+
+    # (cohort, course) list in a room at a day/hour
+    def room_occupants(self, room, day, hour):
+        return self.by_room.get((room, day, hour), [])
+
+    # (cohort, course) list taught by a teacher at a day/hour
+    def teacher_occupants(self, teacher, day, hour):
+        return self.by_teacher.get((teacher, day, hour), [])
+
+    # (day, hour) cells in which a room is used
+    def room_timetable(self, room):
+        return self._timetable(self.room_load[self.room_code[room]])
+
+    # (day, hour) cells in which a teacher teaches
+    def teacher_timetable(self, teacher):
+        return self._timetable(self.teacher_load[self.teacher_code[teacher]])
+
+    def _timetable(self, load):
+        return [(self.days[d], self.hours[h]) for d, h in np.argwhere(load > 0)]
+
+    # (room, day, hour, occupants) for every double-booked room cell
+    def room_conflicts(self):
+        return self._conflicts(self._exclusive_room_load(), self.rooms, self.by_room)
+
+    # (teacher, day, hour, occupants) for every double-booked teacher cell
+    def teacher_conflicts(self):
+        return self._conflicts(self.teacher_load, self.teachers, self.by_teacher)
+
+    # The load finds the cells, the occupant lists of by_room / by_teacher fill them in
+    def _conflicts(self, load, names, occupants):
+        cells = [(names[i], self.days[d], self.hours[h]) for i, d, h in np.argwhere(load > 1)]
+        return [cell + (occupants[cell],) for cell in cells]
+
+    # Number of surplus bookings per room and per teacher
+    def conflict_counts(self):
+        return (np.maximum(self._exclusive_room_load() - 1, 0).sum(axis=(1, 2)),
+                np.maximum(self.teacher_load - 1, 0).sum(axis=(1, 2)))
+
+    # Room loads with the temporary room emptied
+    def _exclusive_room_load(self):
+        load = self.room_load.copy()
+        if TEMP_ROOM in self.room_code:
+            load[self.room_code[TEMP_ROOM]] = 0
+        return load
@@ -0,0 +1,242 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    pa = None
+    CSV_ENGINE = 'c'
+
+
+# Default input file of every table, relative to the input directory
+INPUT_FILES = {
+    'courses': 'courses.csv',
+    'rooms': 'salas.csv',
+    'subject_rooms': 'subjects_preferencias.csv',
+    'subject_teachers': 'subjects_professores.csv',
+    'teacher_days': 'professores_preferencias.csv',
+}
+
+# Columns read from every table, headers are matched after stripping the BOM and whitespace
+INPUT_COLUMNS = {
+    'courses': ['course', 'subj', 'quantityOfClasses'],
+    'rooms': ['sala', 'size'],
+    'subject_rooms': ['subj', 'salas'],
+    'subject_teachers': ['subj', 'professores'],
+    'teacher_days': ['professores', 'dias'],
+}
+
+
+# Scheduler inputs as interned name lists plus integer coded arrays.
+# Every *_<name> array holds codes into the matching list (cohorts, subjects, rooms, teachers, days),
+# rows keep the order of the input files.
+class scheduler_inputs:
+    def __init__(self, cohorts, subjects, rooms, teachers, days, room_capacity,
+                 course_cohort, course_subject, course_hours,
+                 pref_subject, pref_room, qual_subject, qual_teacher, avail_teacher, avail_day):
+        self.cohorts = cohorts
+        self.subjects = subjects
+        self.rooms = rooms
+        self.teachers = teachers
+        self.days = days
+        self.room_capacity = room_capacity
+        # courses.csv: weekly hours of a subject in a cohort
+        self.course_cohort = course_cohort
+        self.course_subject = course_subject
+        self.course_hours = course_hours
+        # subjects_preferencias.csv: preferred rooms of a subject
+        self.pref_subject = pref_subject
+        self.pref_room = pref_room
+        # subjects_professores.csv: teachers qualified for a subject
+        self.qual_subject = qual_subject
+        self.qual_teacher = qual_teacher
+        # professores_preferencias.csv: days a teacher is available
+        self.avail_teacher = avail_teacher
+        self.avail_day = avail_day
+
+    # Boolean teacher x day availability matrix
+    def availability(self):
+        available = np.zeros((len(self.teachers), len(self.days)), dtype=bool)
+        available[self.avail_teacher, self.avail_day] = True
+        return available
+
+    # The dictionaries course_scheduler is built from
+
+    def courses_overall(self):
+        courses_overall = {}
+        frame = pd.DataFrame({'cohort': self.course_cohort, 'subject': self.course_subject, 'hours': self.course_hours})
+        totals = frame.groupby(['cohort', 'subject'], sort=False)['hours'].sum()
+        for (cohort, subject), hours in totals.items():
+            courses_overall.setdefault(self.cohorts[cohort], {})[self.subjects[subject]] = int(hours)
+        return courses_overall
+
+    def salas(self):
+        return dict(zip(self.rooms, self.room_capacity.tolist()))
+
+    def discPreferenciasSala(self):
+        return self._grouped(self.pref_subject, self.subjects, self.pref_room, self.rooms)
+
+    def teachers_Subject(self):
+        return self._grouped(self.qual_subject, self.subjects, self.qual_teacher, self.teachers)
+
+    def preferencas_dias_professores(self):
+        return self._grouped(self.avail_teacher, self.teachers, self.avail_day, self.days)
+
+    # {key name: [value names]} in first-seen key order, keeping duplicate rows like the original readers
+    def _grouped(self, keys, key_names, values, value_names):
+        names = np.array(value_names, dtype=object)[values]
+        grouped = pd.Series(names).groupby(keys, sort=False).agg(list)
+        return {key_names[key]: list(group) for key, group in grouped.items()}
+
+
+def _read_table(path, columns, engine):
+    return _normalise(pd.read_csv(path, dtype=str, encoding='utf-8', engine=engine), columns, path)
+
+
+# Select the wanted columns with BOM-tolerant headers and stripped text values
+def _normalise(frame, columns, path):
+    frame.columns = [str(column).lstrip('\ufeff').strip() for column in frame.columns]
+    missing = [column for column in columns if column not in frame.columns]
+    if missing:
+        raise ValueError(f"{path}: missing columns {missing}")
+    frame = frame[columns].copy()
+    for column in columns:
+        if not pd.api.types.is_numeric_dtype(frame[column]):
+            frame[column] = frame[column].astype(str).str.strip()
+    return frame
+
+
+# Integer codes of values against a fixed vocabulary, -1 for unknown values
+def _codes(values, vocabulary):
+    return pd.Categorical(values, categories=vocabulary).codes.astype(np.int32)
+
+
+# Vocabulary in first-seen order over several columns
+def _vocabulary(*columns):
+    return list(pd.unique(pd.concat([pd.Series(column, dtype=object) for column in columns], ignore_index=True)))
+
+
+# Load all scheduler inputs from a directory, intern the names and validate the cross-references.
+# days fixes the day vocabulary (and order); by default it is the order days first appear in the availability table.
+def load_inputs(directory='.', days=None, files=None, engine=None):
+    files = dict(INPUT_FILES, **(files or {}))
+    engine = engine or CSV_ENGINE
+    tables = {name: _read_table(os.path.join(directory, files[name]), INPUT_COLUMNS[name], engine)
+              for name in INPUT_COLUMNS}
+    return build_inputs(tables, days)
+
+
+# scheduler_inputs from the five tables as DataFrames with the INPUT_COLUMNS columns
+def build_inputs(tables, days=None):
+    courses, rooms, subject_rooms = tables['courses'], tables['rooms'], tables['subject_rooms']
+    subject_teachers, teacher_days = tables['subject_teachers'], tables['teacher_days']
+
+    cohorts = _vocabulary(courses['course'])
+    subjects = _vocabulary(courses['subj'], subject_rooms['subj'], subject_teachers['subj'])
+    teachers = _vocabulary(subject_teachers['professores'], teacher_days['professores'])
+    days = list(days) if days is not None else _vocabulary(teacher_days['dias'])
+
+    # Rooms keep the last capacity given, like a dict built row by row
+    rooms = rooms.drop_duplicates('sala', keep='last')
+    room_names = list(rooms['sala'])
+    room_capacity = pd.to_numeric(rooms['size'], errors='coerce')
+    course_hours = pd.to_numeric(courses['quantityOfClasses'], errors='coerce')
+
+    problems = []
+    if room_capacity.isna().any():
+        problems.append(f"non-numeric room sizes for {list(rooms['sala'][room_capacity.isna()])}")
+    if course_hours.isna().any():
+        problems.append(f"non-numeric quantityOfClasses for {list(courses['subj'][course_hours.isna()])}")
+
+    pref_room = _codes(subject_rooms['salas'], room_names)
+    if (pref_room < 0).any():
+        problems.append(f"room preferences reference unknown rooms {sorted(set(subject_rooms['salas'][pref_room < 0]))}")
+    avail_day = _codes(teacher_days['dias'], days)
+    if (avail_day < 0).any():
+        problems.append(f"teacher availability references unknown days {sorted(set(teacher_days['dias'][avail_day < 0]))}")
+    if problems:
+        raise ValueError("Invalid scheduler inputs: " + "; ".join(problems))
+
+    return scheduler_inputs(
+        cohorts, subjects, room_names, teachers, days, room_capacity.to_numpy(dtype=np.int32),
+        _codes(courses['course'], cohorts), _codes(courses['subj'], subjects), course_hours.to_numpy(dtype=np.int32),
+        _codes(subject_rooms['subj'], subjects), pref_room,
+        _codes(subject_teachers['subj'], subjects), _codes(subject_teachers['professores'], teachers),
+        _codes(teacher_days['professores'], teachers), avail_day,
+    )
+
+
+# Columnar (Parquet / Arrow IPC) inputs and outputs, these need pyarrow
+
+COLUMNAR_SUFFIXES = ('.parquet', '.arrow', '.feather')
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for Parquet/Arrow scheduler files")
+
+
+def _read_columnar(path, memory_map=True):
+    _require_pyarrow()
+    if path.endswith('.parquet'):
+        table = pq.read_table(path, memory_map=memory_map)
+    else:
+        table = feather.read_table(path, memory_map=memory_map)
+    return table.to_pandas()
+
+
+def _write_columnar(frame, path):
+    _require_pyarrow()
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    if path.endswith('.parquet'):
+        pq.write_table(table, path)
+    else:
+        feather.write_feather(table, path)
+
+
+# Same as load_inputs from <table>.parquet / .arrow / .feather files, memory-mapped by default
+def load_inputs_columnar(directory='.', days=None, files=None, memory_map=True):
+    tables = {}
+    for name, columns in INPUT_COLUMNS.items():
+        if files and name in files:
+            path = os.path.join(directory, files[name])
+        else:
+            stem = os.path.join(directory, os.path.splitext(INPUT_FILES[name])[0])
+            candidates = [stem + suffix for suffix in COLUMNAR_SUFFIXES if os.path.exists(stem + suffix)]
+            if not candidates:
+                raise FileNotFoundError(f"no columnar file for {name} in {directory}")
+            path = candidates[0]
+        tables[name] = _normalise(_read_columnar(path, memory_map), columns, path)
+    return build_inputs(tables, days)
+
+
+# Convert the CSV inputs of a directory into columnar files (suffix '.parquet' or '.arrow')
+def convert_inputs(source='.', target='.', suffix='.parquet', engine=None):
+    os.makedirs(target, exist_ok=True)
+    engine = engine or CSV_ENGINE
+    for name, columns in INPUT_COLUMNS.items():
+        frame = _read_table(os.path.join(source, INPUT_FILES[name]), columns, engine)
+        for column in ('size', 'quantityOfClasses'):
+            if column in frame:
+                frame[column] = pd.to_numeric(frame[column])
+        _write_columnar(frame, os.path.join(target, os.path.splitext(INPUT_FILES[name])[0] + suffix))
+
+
+# Solved schedule of every cohort as a (cohort, day, hour, subject, room, teacher) table
+def schedule_table(scheduler):
+    frame = scheduler.solution_frame().rename(columns={'course': 'subject'})
+    frame['teacher'] = frame['subject'].map(scheduler.teachers_Subject)
+    return frame[['cohort', 'day', 'hour', 'subject', 'room', 'teacher']]
+
+
+def write_schedule(scheduler, path):
+    _write_columnar(schedule_table(scheduler), path)
+
+
+def read_schedule(path, memory_map=True):
+    return _read_columnar(path, memory_map)
@@ -0,0 +1,225 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyomo.environ as pyo
+
+from scheduler_model import TEMP_ROOM, cohort_result, extract_solution, room_use_rule
+
+
+# Lagrangian relaxation of the joint model: the room and teacher capacity rows coupling the cohorts are
+# priced into the cohort objectives, so every cohort stays its own model and they can be solved in parallel.
+
+# Cohort objective minus the price of every shared room and teacher slot it uses
+def lagrange_objective_rule(model):
+    return (model.objective.expr
+            - sum(model.room_price[key] * model.room_use[key] for key in model.room_uses)
+            - sum(model.teacher_price[key] * model.schedule[key] for key in model.teacher_slots))
+
+
+# Cohort model with mutable prices on its shared room uses and shared teacher slots
+def _subproblem(scheduler, idx, courses, room_classes, teacher_classes):
+    model = scheduler._build_model(idx, courses)
+    rooms_of = {course: [room for room in model.rooms_for_course[course] if (idx, course) in room_classes.get(room, ())]
+                for course in courses}
+    teacher_of = {course: scheduler.teachers_Subject.get(course) for course in courses}
+    model.room_uses = pyo.Set(dimen=4, ordered = True, initialize=[(day, hour, course, room) for day, hour, course in model.slots
+                                                                   for room in rooms_of[course]])
+    model.teacher_slots = pyo.Set(dimen=3, ordered = True, initialize=[(day, hour, course) for day, hour, course in model.slots
+                                                                       if (idx, course) in teacher_classes.get(teacher_of[course], ())])
+    model.room_price = pyo.Param(model.room_uses, mutable=True, initialize=0)
+    model.teacher_price = pyo.Param(model.teacher_slots, mutable=True, initialize=0)
+    model.room_use = pyo.Var(model.room_uses, bounds=(0, 1))
+    model.room_use_constraint = pyo.Constraint(model.room_uses, rule=room_use_rule)
+    model.objective.deactivate()
+    model.lagrange_objective = pyo.Objective(rule=lagrange_objective_rule, sense=pyo.maximize)
+    return model
+
+
+# Worker entry point, the solved model travels back to the parent
+def _solve_subproblem(scheduler, model):
+    scheduler._solve_model(model)
+    return model
+
+
+# Subgradient optimisation of the room and teacher prices.
+# Every iteration solves the priced cohort models, whose summed value plus the prices is an upper bound
+# on the joint model, then raises the price of every over-booked slot and lowers the others. The clashes
+# left in the cohort schedules are repaired by dropping whole (course, day) blocks, which gives a
+# feasible joint schedule; the best one is kept. Stops when the schedules no longer clash and the bound
+# is within gap of them, or after iterations.
+def solve_lagrangian(scheduler, iterations=30, workers=None, gap=1e-3, step=1.0):
+    scheduler._start_clock()
+    start = time.perf_counter()
+    cohorts = list(range(len(scheduler.courses_overall)))
+    cohort_courses = list(scheduler.courses_overall.values())
+    room_classes, teacher_classes = scheduler._shared_classes(cohorts)
+    rooms, teachers = list(room_classes), list(teacher_classes)
+    models = [_subproblem(scheduler, idx, cohort_courses[idx], room_classes, teacher_classes) for idx in cohorts]
+    shape = (len(scheduler.days), len(scheduler.hours))
+    room_price = np.zeros(shape + (len(rooms),))
+    teacher_price = np.zeros(shape + (len(teachers),))
+
+    best_value, best, best_bound = -np.inf, None, np.inf
+    pool = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    try:
+        for iteration in range(iterations):
+            for model in models:
+                _set_prices(scheduler, model, rooms, teachers, room_price, teacher_price)
+            if pool is not None:
+                models = list(pool.map(_solve_subproblem, [scheduler] * len(models), models))
+            else:
+                for model in models:
+                    scheduler._solve_model(model)
+            solutions = [extract_solution(model) for model in models]
+
+            # The priced value is an upper bound only from the solvers' dual bounds; a subproblem stopped
+            # by a limit without one leaves the bound alone and only steers the step
+            prices = room_price.sum() + teacher_price.sum()
+            relaxed = sum(pyo.value(model.lagrange_objective) for model in models) + prices
+            bounds = [_bound(model) for model in models]
+            if None not in bounds:
+                best_bound = min(best_bound, sum(bounds) + prices)
+            room_load, teacher_load = _loads(scheduler, solutions, rooms, teachers)
+            clashes = int(np.maximum(room_load - 1, 0).sum() + np.maximum(teacher_load - 1, 0).sum())
+            repaired = repair(scheduler, solutions, rooms, teachers) if clashes else solutions
+            value = sum(_value(solution, courses) for solution, courses in zip(repaired, cohort_courses))
+            if value > best_value:
+                best_value, best = value, repaired
+            print(f"Iteration {iteration}: bound {best_bound:.1f}, best schedule {best_value:.1f}, {clashes} clashes")
+            if best_bound - best_value <= gap * max(abs(best_value), 1):
+                break
+            # Run budget spent, the later subproblem solves would all be skipped
+            if scheduler.deadline is not None and time.time() >= scheduler.deadline:
+                break
+
+            # Polyak step towards the best schedule, prices stay non-negative
+            room_grad, teacher_grad = room_load - 1, teacher_load - 1
+            norm = float((room_grad ** 2).sum() + (teacher_grad ** 2).sum())
+            if norm == 0:
+                break
+            size = step * max(relaxed - best_value, 0) / norm
+            room_price = np.maximum(room_price + size * room_grad, 0)
+            teacher_price = np.maximum(teacher_price + size * teacher_grad, 0)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    seconds = time.perf_counter() - start
+    suboptimal = bool(best_bound - best_value > gap * max(abs(best_value), 1))
+    scheduler.models = models
+    scheduler.solutions = best
+    scheduler.results = [cohort_result(idx, 'lagrangian', _value(solution, cohort_courses[idx]), seconds=seconds, suboptimal=suboptimal)
+                         for idx, solution in enumerate(best)]
+    for result in scheduler.results:
+        print(result)
+    return scheduler.results
+
+
+# Dual bound of a solved subproblem: the solver's bound, or the objective when solved to optimality
+def _bound(model):
+    if model.result.bound is not None:
+        return model.result.bound
+    if not model.suboptimal and model.has_solution:
+        return pyo.value(model.lagrange_objective)
+    return None
+
+
+def _set_prices(scheduler, model, rooms, teachers, room_price, teacher_price):
+    day = {d: i for i, d in enumerate(scheduler.days)}
+    hour = {h: i for i, h in enumerate(scheduler.hours)}
+    room = {r: i for i, r in enumerate(rooms)}
+    teacher = {t: i for i, t in enumerate(teachers)}
+    for (d, h, c, r) in model.room_uses:
+        model.room_price[d, h, c, r] = room_price[day[d], hour[h], room[r]]
+    for (d, h, c) in model.teacher_slots:
+        model.teacher_price[d, h, c] = teacher_price[day[d], hour[h], teacher[scheduler.teachers_Subject[c]]]
+
+
+# Classes per slot of every shared room and teacher
+def _loads(scheduler, solutions, rooms, teachers):
+    shape = (len(scheduler.days), len(scheduler.hours))
+    room_load = np.zeros(shape + (len(rooms),))
+    teacher_load = np.zeros(shape + (len(teachers),))
+    room_code = {r: i for i, r in enumerate(rooms)}
+    teacher_code = {t: i for i, t in enumerate(teachers)}
+    for solution in solutions:
+        for d, h, c in zip(*np.nonzero(solution.schedule)):
+            r = solution.room[d, h, c]
+            if r >= 0 and solution.rooms[r] in room_code:
+                room_load[d, h, room_code[solution.rooms[r]]] += 1
+            teacher = scheduler.teachers_Subject.get(solution.courses[c])
+            if teacher in teacher_code:
+                teacher_load[d, h, teacher_code[teacher]] += 1
+    return room_load, teacher_load
+
+
+# Copies of the solutions where, in every slot, only the first cohort keeps a shared room or teacher;
+# the other classes lose their whole block of that day, so every cohort rule still holds. The freed
+# hours are then refilled with two-hour blocks of courses below their weekly hours, on days their teacher
+# is available, where the cohort, the teacher and a suitable room are all free.
+def repair(scheduler, solutions, rooms, teachers):
+    repaired = [type(solution)(solution.days, solution.hours, solution.courses, solution.rooms,
+                               solution.schedule.copy(), solution.room.copy(), solution.suboptimal)
+                for solution in solutions]
+    shared_rooms, shared_teachers = set(rooms), set(teachers)
+    for d in range(len(scheduler.days)):
+        for h in range(len(scheduler.hours)):
+            taken = set()
+            for solution in repaired:
+                for c in np.flatnonzero(solution.schedule[d, h]):
+                    r = solution.room[d, h, c]
+                    room = solution.rooms[r] if r >= 0 else None
+                    teacher = scheduler.teachers_Subject.get(solution.courses[c])
+                    needs = {('room', room)} if room in shared_rooms else set()
+                    if teacher in shared_teachers:
+                        needs.add(('teacher', teacher))
+                    if needs & taken:
+                        solution.schedule[d, :, c] = False
+                        solution.room[d, :, c] = -1
+                    else:
+                        taken |= needs
+    _refill(scheduler, repaired)
+    return repaired
+
+
+def _refill(scheduler, solutions):
+    n_hours = len(scheduler.hours)
+    room_busy = np.zeros((len(scheduler.days), n_hours, len(scheduler.salas)), dtype=bool)
+    teacher_busy = {}
+    for solution in solutions:
+        for d, h, c in zip(*np.nonzero(solution.schedule)):
+            if solution.room[d, h, c] >= 0 and solution.rooms[solution.room[d, h, c]] != TEMP_ROOM:
+                room_busy[d, h, solution.room[d, h, c]] = True
+            teacher = scheduler.teachers_Subject.get(solution.courses[c])
+            teacher_busy.setdefault(teacher, np.zeros(room_busy.shape[:2], dtype=bool))[d, h] = True
+
+    for idx, (solution, courses) in enumerate(zip(solutions, scheduler.courses_overall.values())):
+        available = scheduler._availability(courses)
+        suitable = scheduler._suitable_rooms(courses, scheduler.quantity_students[idx])
+        for c, (course, weekly_hours) in enumerate(courses.items()):
+            teacher = scheduler.teachers_Subject.get(course)
+            busy = teacher_busy.setdefault(teacher, np.zeros(room_busy.shape[:2], dtype=bool))
+            room_codes = [solution.rooms.index(room) for room in suitable[course]]
+            for d in range(len(scheduler.days)):
+                if solution.schedule[:, :, c].sum() + 2 > weekly_hours:
+                    break
+                if solution.schedule[d, :, c].any():
+                    continue
+                for h in range(n_hours - 1):
+                    hours = slice(h, h + 2)
+                    if not available[c, d, hours].all() or solution.schedule[d, hours].any() or busy[d, hours].any():
+                        continue
+                    free = [r for r in room_codes if solution.rooms[r] == TEMP_ROOM or not room_busy[d, hours, r].any()]
+                    if not free:
+                        continue
+                    solution.schedule[d, hours, c] = True
+                    solution.room[d, hours, c] = free[0]
+                    busy[d, hours] = True
+                    if solution.rooms[free[0]] != TEMP_ROOM:
+                        room_busy[d, hours, free[0]] = True
+                    break
+
+
+def _value(solution, courses):
+    return float(solution.schedule.sum(axis=(0, 1)) @ np.array(list(courses.values())))
@@ -0,0 +1,248 @@
+import numpy as np
+import pyomo.environ as pyo
+from pyomo.repn import generate_standard_repn
+from scipy import sparse
+from scipy.optimize import milp, LinearConstraint, Bounds
+
+from scheduler_model import cohort_solution, course_scheduler
+
+
+# Same formulation as course_scheduler._build_model, emitted as sparse coefficient matrices.
+# Columns are the schedule slots (day, hour, course) followed by the room slots
+# (day, hour, course, room), both in the order the Pyomo model declares them.
+class matrix_model:
+    def __init__(self, days, hours, courses, rooms, slot_day, slot_hour, slot_course, room_slot, room_room,
+                 objective, A, row_lb, row_ub, families):
+        self.days = days
+        self.hours = hours
+        self.courses = courses
+        self.rooms = rooms
+        # Integer coded schedule columns
+        self.slot_day = slot_day
+        self.slot_hour = slot_hour
+        self.slot_course = slot_course
+        # Integer coded room columns, room_slot points back to the schedule column
+        self.room_slot = room_slot
+        self.room_room = room_room
+        self.objective = objective
+        self.A = A
+        self.row_lb = row_lb
+        self.row_ub = row_ub
+        # Constraint family name -> (first row, last row + 1)
+        self.families = families
+
+    @property
+    def n_slots(self):
+        return len(self.slot_day)
+
+    @property
+    def n_columns(self):
+        return self.A.shape[1]
+
+    @property
+    def n_rows(self):
+        return self.A.shape[0]
+
+
+# Rows summing the columns that share a group key, one row per distinct key in key order
+def _group_rows(keys, columns):
+    _, rows = np.unique(keys, return_inverse=True)
+    return rows, columns, np.ones(len(columns))
+
+
+def build_matrix_model(scheduler, idx, courses):
+    days, hours, rooms = list(scheduler.days), list(scheduler.hours), list(scheduler.salas)
+    course_list = list(courses)
+    n_days, n_hours, n_courses = len(days), len(hours), len(course_list)
+
+    # Schedule columns from the availability mask, in day, hour, course order
+    available = scheduler._availability(courses).transpose(1, 2, 0)
+    slot_day, slot_hour, slot_course = np.nonzero(available)
+    n_slots = len(slot_day)
+    slot_id = np.full(available.shape, -1)
+    slot_id[slot_day, slot_hour, slot_course] = np.arange(n_slots)
+
+    # Room columns from the sparse (course, room) pairs, flattened per course
+    room_code = {room: r for r, room in enumerate(rooms)}
+    rooms_for_course = scheduler._suitable_rooms(courses, scheduler.quantity_students[idx])
+    course_rooms = [np.array([room_code[room] for room in rooms_for_course[course]], dtype=int) for course in course_list]
+    rooms_count = np.array([len(r) for r in course_rooms])
+    rooms_offset = np.concatenate(([0], np.cumsum(rooms_count)[:-1]))
+    rooms_flat = np.concatenate(course_rooms) if course_rooms else np.zeros(0, dtype=int)
+
+    counts = rooms_count[slot_course]
+    room_slot = np.repeat(np.arange(n_slots), counts)
+    position = np.arange(len(room_slot)) - np.repeat(np.cumsum(counts) - counts, counts)
+    room_room = rooms_flat[np.repeat(rooms_offset[slot_course], counts) + position]
+    n_room_slots = len(room_slot)
+    room_id = np.full((n_days, n_hours, n_courses, len(rooms)), -1)
+    room_id[slot_day[room_slot], slot_hour[room_slot], slot_course[room_slot], room_room] = n_slots + np.arange(n_room_slots)
+
+    blocks = []
+    families = {}
+    n_rows = 0
+
+    def add_family(name, rows, cols, vals, lb, ub):
+        nonlocal n_rows
+        count = int(rows.max()) + 1 if len(rows) else 0
+        blocks.append((rows + n_rows, cols, vals))
+        families[name] = (n_rows, n_rows + count)
+        row_lb.append(np.full(count, lb, dtype=float))
+        row_ub.append(np.full(count, ub, dtype=float))
+        n_rows += count
+
+    row_lb, row_ub = [], []
+    slots = np.arange(n_slots)
+
+    # Only one subject per Room at a time
+    add_family('single_assignment_constraint', *_group_rows(slot_day * n_hours + slot_hour, slots), -np.inf, 1)
+    # Max hours for the same subject per day
+    add_family('max_hours_per_day_constraint', *_group_rows(slot_course * n_days + slot_day, slots), -np.inf, 2)
+
+    # Max hours for the same subject per week, the bound differs per course
+    rows, cols, vals = _group_rows(slot_course, slots)
+    add_family('max_hours_per_week_constraint', rows, cols, vals, -np.inf, 0)
+    week_hours = np.array([courses[course] for course in course_list], dtype=float)
+    row_ub[-1] = week_hours[np.unique(slot_course)]
+
+    # Every available slot gets exactly one of its suitable rooms
+    add_family('room_assignment_constraint', room_slot, n_slots + np.arange(n_room_slots), np.ones(n_room_slots), 1, 1)
+
+    # Subjects in a row in the same room
+    has_next = slot_hour[room_slot] < n_hours - 1
+    next_id = np.full(n_room_slots, -1)
+    next_id[has_next] = room_id[slot_day[room_slot][has_next], slot_hour[room_slot][has_next] + 1,
+                                slot_course[room_slot][has_next], room_room[has_next]]
+    linked = np.nonzero(next_id >= 0)[0]
+    rows = np.repeat(np.arange(len(linked)), 2)
+    cols = np.column_stack((n_slots + linked, next_id[linked])).ravel()
+    vals = np.tile([1.0, -1.0], len(linked))
+    add_family('same_room_next_to_each_other_constraint', rows, cols, vals, 0, 0)
+
+    # Join subjects
+    prev_slot = np.where(slot_hour > 0, slot_id[slot_day, np.maximum(slot_hour - 1, 0), slot_course], -1)
+    next_slot = np.where(slot_hour < n_hours - 1, slot_id[slot_day, np.minimum(slot_hour + 1, n_hours - 1), slot_course], -1)
+    rows = [slots]
+    cols = [slots]
+    vals = [np.ones(n_slots)]
+    for neighbour in (next_slot, prev_slot):
+        present = neighbour >= 0
+        rows.append(slots[present])
+        cols.append(neighbour[present])
+        vals.append(-np.ones(present.sum()))
+    add_family('remove_spaces_constraint', np.concatenate(rows), np.concatenate(cols), np.concatenate(vals), -np.inf, 0)
+
+    rows, cols, vals = (np.concatenate(part) for part in zip(*blocks))
+    A = sparse.csr_matrix((vals, (rows, cols)), shape=(n_rows, n_slots + n_room_slots))
+    A.sum_duplicates()
+
+    # Objective, maximize weekly hours weighted schedule
+    objective = np.zeros(n_slots + n_room_slots)
+    objective[:n_slots] = week_hours[slot_course]
+
+    return matrix_model(days, hours, course_list, rooms, slot_day, slot_hour, slot_course, room_slot, room_room,
+                        objective, A, np.concatenate(row_lb), np.concatenate(row_ub), families)
+
+
+# Hand the matrices straight to HiGHS through scipy, returns the scipy result
+def solve_matrix_model(mm, time_limit=None):
+    options = {}
+    if time_limit is not None:
+        options['time_limit'] = time_limit
+    return milp(-mm.objective,
+                constraints=LinearConstraint(mm.A, mm.row_lb, mm.row_ub),
+                integrality=np.ones(mm.n_columns),
+                bounds=Bounds(0, 1),
+                options=options)
+
+
+# cohort_solution of a solved matrix model, the same structure the Pyomo path extracts
+def decode_solution(mm, values):
+    schedule = np.zeros((len(mm.days), len(mm.hours), len(mm.courses)), dtype=bool)
+    room = np.full(schedule.shape, -1)
+    scheduled = values[:mm.n_slots] > 0.5
+    schedule[mm.slot_day[scheduled], mm.slot_hour[scheduled], mm.slot_course[scheduled]] = True
+    assigned = np.nonzero(values[mm.n_slots:] > 0.5)[0]
+    slots = mm.room_slot[assigned]
+    room[mm.slot_day[slots], mm.slot_hour[slots], mm.slot_course[slots]] = mm.room_room[assigned]
+    room[~schedule] = -1
+    return cohort_solution(mm.days, mm.hours, mm.courses, mm.rooms, schedule, room)
+
+
+# Build and solve every cohort with the matrix engine, the solutions feed the scheduler's printers
+def solve_cohorts(scheduler, time_limit=None):
+    solutions = []
+    for idx, courses in enumerate(scheduler.courses_overall.values()):
+        mm = build_matrix_model(scheduler, idx, courses)
+        result = solve_matrix_model(mm, time_limit)
+        print(result.message)
+        if result.x is None:
+            result.x = np.zeros(mm.n_columns)
+        solutions.append(decode_solution(mm, result.x))
+    scheduler.solutions = solutions
+    return solutions
+
+
+# Column of every Pyomo variable in the matrix_model order
+def _pyomo_columns(model):
+    column = {}
+    for var in model.schedule.values():
+        column[id(var)] = len(column)
+    for var in model.room_assignment.values():
+        column[id(var)] = len(column)
+    return column
+
+
+# Coefficient matrix and row bounds of a Pyomo cohort model
+def _pyomo_matrix(model, column):
+    rows, cols, vals, lb, ub = [], [], [], [], []
+    for row, con in enumerate(model.component_data_objects(pyo.Constraint, active=True, descend_into=True)):
+        repn = generate_standard_repn(con.body)
+        for var, coef in zip(repn.linear_vars, repn.linear_coefs):
+            rows.append(row)
+            cols.append(column[id(var)])
+            vals.append(coef)
+        constant = repn.constant
+        lb.append(-np.inf if con.lower is None else pyo.value(con.lower) - constant)
+        ub.append(np.inf if con.upper is None else pyo.value(con.upper) - constant)
+    A = sparse.csr_matrix((vals, (rows, cols)), shape=(len(lb), len(column)))
+    A.sum_duplicates()
+    return A, np.array(lb), np.array(ub)
+
+
+# Check the matrix engine emits exactly the Pyomo formulation of every cohort
+def check_parity(scheduler):
+    if scheduler.room_formulation != 'hourly':
+        raise ValueError("The matrix model only has the hourly room formulation")
+    for idx, courses in enumerate(scheduler.courses_overall.values()):
+        model = scheduler._build_model(idx, courses)
+        mm = build_matrix_model(scheduler, idx, courses)
+        column = _pyomo_columns(model)
+        A, lb, ub = _pyomo_matrix(model, column)
+
+        assert mm.A.shape == A.shape, f"cohort {idx}: shape {mm.A.shape} != {A.shape}"
+        assert (mm.A != A).nnz == 0, f"cohort {idx}: coefficient matrices differ"
+        assert np.array_equal(mm.row_lb, lb) and np.array_equal(mm.row_ub, ub), f"cohort {idx}: row bounds differ"
+
+        objective = np.zeros(mm.n_columns)
+        repn = generate_standard_repn(model.objective.expr)
+        for var, coef in zip(repn.linear_vars, repn.linear_coefs):
+            objective[column[id(var)]] += coef
+        assert np.array_equal(mm.objective, objective), f"cohort {idx}: objectives differ"
+        print(f"Cohort {idx}: {mm.n_columns} columns, {mm.n_rows} rows, {mm.A.nnz} nonzeros match the Pyomo model")
+
+
+if __name__ == "__main__":
+    from scheduler_io import load_inputs
+    from scheduler_teachers import course_hours
+    from test_scheduler import assign_teachers_to_courses
+
+    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    hours = [9, 10, 11, 12, 13, 14, 15, 16, 17]
+    inputs = load_inputs(".", days)
+    teachers_chosen = assign_teachers_to_courses(inputs.teachers_Subject(), inputs.preferencas_dias_professores(),
+                                                 course_hours(inputs.courses_overall()))
+    scheduler = course_scheduler(days, hours, inputs.courses_overall(), 8, teachers_chosen,
+                                 inputs.preferencas_dias_professores(), inputs.salas(),
+                                 inputs.discPreferenciasSala(), [20, 20, 22, 20])
+    check_parity(scheduler)
@@ -1,19 +1,294 @@
+import os
+import signal
+import time
+
 import pyomo.environ as pyo
+from pyomo.opt import SolutionStatus, TerminationCondition
 import numpy as np
 import pandas as pd
 
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
 from reportlab.lib import colors
-import random
 
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import Paragraph
 from reportlab.platypus import Spacer
 from reportlab.lib.enums import TA_CENTER
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+
+from scheduler_backends import cbc_backend, make_backend
+from scheduler_heuristic import greedy_blocks
+from scheduler_profile import profile_report
+from scheduler_search import anneal_blocks
+
+
+# Fallback room of classes no preferred room fits, it holds any number of classes at once: it gets no
+# capacity rows, is never held in the two-phase occupancy and never counts as double booked
+TEMP_ROOM = "Temp Room"
+
+# Constraint rules live at module level so built models can be pickled back from worker processes
+
+# Schedule variable of a slot, slots removed by the availability mask count as 0
+def _slot(model, day, hour, course):
+    if (day, hour, course) in model.schedule:
+        return model.schedule[day, hour, course]
+    return 0
+
+# Only one subject per Room at a time
+def single_assignment_constraint(model, day, hour):
+    slots = [model.schedule[day, hour, course] for course in model.courses if (day, hour, course) in model.schedule]
+    if not slots:
+        return pyo.Constraint.Skip
+    return sum(slots) <= 1
+
+# Max hours for the same subject per day
+def max_hours_per_day_constraint(model, course, day):
+    slots = [model.schedule[day, hour, course] for hour in model.hours if (day, hour, course) in model.schedule]
+    if not slots:
+        return pyo.Constraint.Skip
+    return sum(slots) <= 2
+
+# Constraint: Max hours for the same subject per week
+def max_hours_per_week_constraint(model, course):
+    slots = [model.schedule[day, hour, course] for day in model.days for hour in model.hours if (day, hour, course) in model.schedule]
+    if not slots:
+        return pyo.Constraint.Skip
+    return sum(slots) <= model.max_hours_per_week[course]
+
+# Rooms Constraint and preferences, only the suitable rooms of the course exist as variables
+def room_assignment_constraint(model, day, hour, course):
+    return sum(model.room_assignment[day, hour, course, room] for room in model.rooms_for_course[course]) == 1
+
+# Subjects in a row in the same room
+def same_room_next_to_each_other_constraint(model, day, hour, course, room):
+    next_hour = model.next_hour[hour]  # None for the last hour of the day
+    if (day, next_hour, course, room) not in model.room_assignment:  # Last or unavailable next hour
+        return pyo.Constraint.Skip
+    return model.room_assignment[day, hour, course, room] == model.room_assignment[day, next_hour, course, room]
+
+# Per-day room formulation: at most one room per course and day, every scheduled hour of the day uses it
+def room_day_constraint(model, day, course):
+    return sum(model.room_day[day, course, room] for room in model.rooms_for_course[course]) <= 1
+
+def room_day_link_constraint(model, day, course):
+    slots = [model.schedule[day, hour, course] for hour in model.hours if (day, hour, course) in model.schedule]
+    return sum(slots) <= 2 * sum(model.room_day[day, course, room] for room in model.rooms_for_course[course])
+
+# Join subjects, the first and last hours of the day have no previous / next hour
+def remove_spaces_constraint(model, day, hour, course):
+    next_hour, prev_hour = model.next_hour[hour], model.prev_hour[hour]
+    return model.schedule[day, hour, course] - (_slot(model, day, next_hour, course) + _slot(model, day, prev_hour, course)) <= 0
+
+
+# Objective
+def objective_rule(model):
+    return sum(model.schedule[d, h, c] * model.hours_per_course[c] for d, h, c in model.slots)
+
+
+# room_use is 1 when the class is scheduled in the slot and sits in the room. Rule of a cohort model with
+# its own room_use (the Lagrangian subproblems), the joint model passes the use from its own variable.
+def room_use_rule(model, day, hour, course, room, use=None):
+    if use is None:
+        use = model.room_use[day, hour, course, room]
+    if model.room_formulation == 'daily':
+        assigned = model.room_day[day, course, room]
+    else:
+        assigned = model.room_assignment[day, hour, course, room]
+    return use >= model.schedule[day, hour, course] + assigned - 1
+
+
+# Joint model of several cohorts, every cohort model is a block of cohort_models
+
+def room_use_constraint(model, idx, day, hour, course, room):
+    return room_use_rule(model.cohort_models[idx], day, hour, course, room, model.room_use[idx, day, hour, course, room])
+
+# A shared room holds one class per slot
+def room_capacity_constraint(model, day, hour, room):
+    uses = [model.room_use[idx, day, hour, course, room] for idx, course in model.room_classes[room]
+            if (idx, day, hour, course, room) in model.room_use]
+    if len(uses) < 2:
+        return pyo.Constraint.Skip
+    return sum(uses) <= 1
+
+# A shared teacher gives one class per slot
+def teacher_capacity_constraint(model, day, hour, teacher):
+    slots = [model.cohort_models[idx].schedule[day, hour, course] for idx, course in model.teacher_classes[teacher]
+             if (day, hour, course) in model.cohort_models[idx].schedule]
+    if len(slots) < 2:
+        return pyo.Constraint.Skip
+    return sum(slots) <= 1
+
+
+# Worker entry point for solve_parallel: model (None when the run budget was spent before it was built),
+# solution, cohort_result and profile entry of a cohort
+def _build_and_solve_cohort(scheduler, idx, courses):
+    if scheduler._out_of_time():
+        model = None
+        solution, result = scheduler._skipped_cohort(idx, courses)
+    else:
+        model = scheduler._build_model(idx, courses)
+        scheduler._solve_model(model)
+        solution, result = extract_solution(model), model.result
+    profile = scheduler.profile.cohort(idx) if scheduler.profile is not None else None
+    return model, solution, result, profile
+
+# Worker initializer of fail_fast pools: every worker leads its own process group, so stopping it also
+# stops the solver process it started. Ctrl-C no longer reaches the group, solve_parallel stops it instead
+def _own_process_group():
+    if hasattr(os, 'setpgrp'):
+        os.setpgrp()
+
+# Stop the workers of a pool and the solves running in them. The executor has no public way to stop
+# running tasks, so this goes through its worker processes
+def _terminate_workers(pool):
+    for process in list((pool._processes or {}).values()):
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(process.pid, signal.SIGTERM)
+            else:
+                process.terminate()
+        except ProcessLookupError:
+            pass
+
+# Solution statuses of an integer feasible point, CBC stopped before finding one reports 'other' with the LP values
+FEASIBLE_STATUSES = (SolutionStatus.optimal, SolutionStatus.globallyOptimal, SolutionStatus.locallyOptimal,
+                     SolutionStatus.feasible, SolutionStatus.bestSoFar, SolutionStatus.stoppedByLimit)
+
+# Load the best solution the solver found, a model stopped by a time/gap/node limit keeps its incumbent
+# and is flagged suboptimal instead of failing
+def _load_incumbent(model, result):
+    termination = result.solver.termination_condition
+    # CBC reports a solve stopped at the gap target as optimal, the open bound gives it away
+    bounds = result.problem.lower_bound, result.problem.upper_bound
+    open_gap = all(isinstance(b, (int, float)) and np.isfinite(b) for b in bounds) and abs(bounds[1] - bounds[0]) > 1e-6
+    model.suboptimal = termination != TerminationCondition.optimal or open_gap
+    model.has_solution = len(result.solution) > 0 and result.solution(0).status in FEASIBLE_STATUSES
+    if model.has_solution:
+        model.solutions.load_from(result)
+    elif termination in INFEASIBLE:
+        # Nothing to keep, not even the warm start
+        for var in model.component_data_objects(pyo.Var):
+            var.set_value(None)
+        model.warm_started = False
+    if model.suboptimal:
+        if model.has_solution:
+            found = "keeping the best schedule found"
+        elif getattr(model, 'warm_started', False):
+            # The variables still hold the greedy start
+            found = "keeping the greedy schedule"
+        else:
+            found = "no schedule found"
+        print(f"Cohort {model.cohort}: solver stopped with {termination}, {found}")
+
+# Proven infeasible, fail_fast stops the other cohort solves on these
+INFEASIBLE = (TerminationCondition.infeasible, TerminationCondition.infeasibleOrUnbounded)
+
+# Outcome of one cohort solve: termination status, objective of the loaded schedule, best bound,
+# relative gap, solve seconds and branch and bound nodes (None where the backend does not report it)
+class cohort_result:
+    def __init__(self, cohort, status, objective=None, bound=None, gap=None, seconds=None, nodes=None, suboptimal=False):
+        self.cohort = cohort
+        self.status = status
+        self.objective = objective
+        self.bound = bound
+        self.gap = gap
+        self.seconds = seconds
+        self.nodes = nodes
+        self.suboptimal = suboptimal
+
+    @property
+    def infeasible(self):
+        return self.status in [str(condition) for condition in INFEASIBLE]
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={value!r}" for name, value in vars(self).items() if value is not None)
+        return f"cohort_result({fields})"
+
+
+def _finite(value):
+    return float(value) if isinstance(value, (int, float)) and np.isfinite(value) else None
+
+# cohort_result of a Pyomo solve, the bound is the upper bound of the maximised objective
+def _cohort_result(model, result):
+    objective = _finite(pyo.value(model.objective, exception=False))
+    bound = _finite(result.problem.upper_bound)
+    gap = abs(bound - objective) / max(abs(objective), 1e-10) if objective is not None and bound is not None else None
+    seconds = _finite(getattr(result.solver, 'wallclock_time', None)) or getattr(model, 'solve_seconds', None)
+    nodes = result.solver.statistics.branch_and_bound.number_of_created_subproblems
+    return cohort_result(model.cohort, str(result.solver.termination_condition), objective, bound, gap, seconds,
+                         int(nodes) if isinstance(nodes, (int, float)) else None, getattr(model, 'suboptimal', False))
+
+# Solved timetable of one cohort: dense day x hour x course schedule and the room index of every cell (-1 when empty)
+class cohort_solution:
+    def __init__(self, days, hours, courses, rooms, schedule, room, suboptimal=False):
+        self.days = list(days)
+        self.hours = list(hours)
+        self.courses = list(courses)
+        self.rooms = list(rooms)
+        self.schedule = schedule
+        self.room = room
+        # The solver hit a limit before proving this schedule optimal
+        self.suboptimal = suboptimal
+
+    # (course, room) held at a day/hour cell, None when the cell is free
+    def cell(self, d, h):
+        scheduled = np.flatnonzero(self.schedule[d, h])
+        if len(scheduled) == 0:
+            return None
+        c = scheduled[0]
+        r = self.room[d, h, c]
+        return self.courses[c], self.rooms[r] if r >= 0 else None
+
+    # Tidy (day, hour, course, room) table of the scheduled cells
+    def frame(self):
+        d, h, c = np.nonzero(self.schedule)
+        r = self.room[d, h, c]
+        rooms = np.array(self.rooms + [None], dtype=object)
+        return pd.DataFrame({
+            'day': np.array(self.days, dtype=object)[d],
+            'hour': np.array(self.hours, dtype=object)[h],
+            'course': np.array(self.courses, dtype=object)[c],
+            'room': rooms[r],
+        })
+
+
+# One pass over the solved variables of a cohort model into a cohort_solution
+def extract_solution(model):
+    days, hours, courses, rooms = list(model.days), list(model.hours), list(model.courses), list(model.rooms)
+    schedule = np.zeros((len(days), len(hours), len(courses)), dtype=bool)
+    room = np.full(schedule.shape, -1)
+
+    # Slots follow the availability mask order, so their codes come straight from it
+    slot_day, slot_hour, slot_course = np.nonzero(model.available.transpose(1, 2, 0))
+    values = np.fromiter((var.value or 0 for var in model.schedule.values()), dtype=float, count=len(slot_day))
+    scheduled = values > 0.5
+    schedule[slot_day[scheduled], slot_hour[scheduled], slot_course[scheduled]] = True
+
+    day_code = {day: d for d, day in enumerate(days)}
+    hour_code = {hour: h for h, hour in enumerate(hours)}
+    course_code = {course: c for c, course in enumerate(courses)}
+    room_code = {r: i for i, r in enumerate(rooms)}
+    if model.room_formulation == 'daily':
+        for (day, course, r), var in model.room_day.items():
+            if var.value is not None and var.value > 0.5:
+                room[day_code[day], :, course_code[course]] = room_code[r]
+    elif model.room_formulation == 'hourly':
+        for (day, hour, course, r), var in model.room_assignment.items():
+            if var.value is not None and var.value > 0.5:
+                room[day_code[day], hour_code[hour], course_code[course]] = room_code[r]
+    room[~schedule] = -1
+
+    return cohort_solution(days, hours, courses, rooms, schedule, room, getattr(model, 'suboptimal', False))
+
 
 class course_scheduler:
-    def __init__(self, days, hours, courses_overall, max_hours_per_day, teachers_Subject, preferencas_dias_professores, salas, discPreferenciasSala , quantity_students):
+    # room_formulation 'hourly' assigns a room to every (day, hour, course) slot and keeps it equal between
+    # consecutive hours, 'daily' has one room variable per (day, course) linked to the schedule
+    def __init__(self, days, hours, courses_overall, max_hours_per_day, teachers_Subject, preferencas_dias_professores, salas, discPreferenciasSala , quantity_students, room_formulation='hourly'):
+        if room_formulation not in ('hourly', 'daily'):
+            raise ValueError(f"Unknown room formulation {room_formulation!r}")
         self.days = days
         self.hours = hours
         self.courses_overall = courses_overall
@@ -23,152 +298,509 @@ class course_scheduler:
         self.salas = dict(salas)
         self.discPreferenciasSala = dict(discPreferenciasSala)
         self.models = []
+        self.solutions = []
+        self.results = []
         self.quantity_students = quantity_students
+        self.profile = None
+        self.room_formulation = room_formulation
+        # Solver limits, None means unlimited
+        self.time_limit = None
+        self.total_time_limit = None
+        self.gap = None
+        self.node_limit = None
+        self.deadline = None
+        # When create_model started building, solve counts the build towards total_time_limit
+        self.build_start = None
+        # Start every solve from the greedy schedule
+        self.warm_start = True
+        # Solver of the cohort models, see set_backend
+        self.backend = cbc_backend()
+        # Cohort independent part of the models, built on first use
+        self._skeleton = None
     
 
     def create_model(self):
-
-
-        for idx,courses in enumerate(self.courses_overall.values()):
-            
-            model = pyo.ConcreteModel()
-            
-            # Sets
-            model.days = pyo.Set(initialize=self.days, ordered = True)
-            # Define continuous hour set starting from 9:00 AM
-            model.hours = pyo.Set(initialize=self.hours , ordered = True)
-            model.courses = pyo.Set(initialize=courses.keys())
+        self.build_start = time.time()
+        for idx, courses in enumerate(self.courses_overall.values()):
+            self.models.append(self._build_model(idx, courses))
+
+    # room_formulation overrides the scheduler's, 'none' leaves rooms out (phase 1 of the two-phase solve);
+    # mask is an extra day x hour x course mask of allowed slots
+    def _build_model(self, idx, courses, room_formulation=None, mask=None):
+        room_formulation = room_formulation or self.room_formulation
+
+        with self._phase(idx, 'sets_params'):
+            # Days, hours, rooms and teachers come from the shared skeleton
+            model = self._model_skeleton().clone()
+            model.cohort = idx
+            model.room_formulation = room_formulation
+            courses_list = list(courses)
+            model.courses = pyo.Set(initialize=courses_list)
 
-            # Parameters
-            model.teacher_indices = pyo.Set(initialize=self.teachers_Subject.keys())
-            model.teacher = pyo.Param(model.teacher_indices, initialize=self.teachers_Subject, within=pyo.Any)
-            model.rooms = pyo.Set(initialize=self.salas.keys())
-            model.rooms_quantity = pyo.Param(model.rooms, initialize=self.salas, within=pyo.NonNegativeIntegers)
-
-            
             # Parameters
             model.hours_per_course = pyo.Param(model.courses, initialize=courses)
             model.max_hours_per_day = self.max_hours_per_day
             model.discPreferenciasSala = self.discPreferenciasSala
+            # Sparse (course, room) pairs the course can actually be assigned to
+            model.rooms_for_course = self._suitable_rooms(courses, self.quantity_students[idx])
+            model.course_rooms = pyo.Set(dimen=2, initialize=[(course, room) for course, rooms in model.rooms_for_course.items() for room in rooms], ordered = True)
             # Max hours per week per course
             model.max_hours_per_week = {course: hours for course, hours in courses.items()}
             model.preferencas_dias_professores = self.preferencas_dias_professores
-            
-            # Variables
-            model.schedule = pyo.Var(model.days, model.hours, model.courses , domain=pyo.Binary)
-
-            model.room_assignment = pyo.Var(model.days, model.hours, model.courses, model.rooms, domain=pyo.Binary)
-
-
-            #Constraints
-            # Only one subject per Room at a time
-            def single_assignment_constraint(model, day, hour):
-                return sum(model.schedule[day, hour, course] for course in model.courses) <= 1
-            
+            model.quantity_students = self.quantity_students[idx]
+
+            # Slots where the course teacher is available, computed once as a course x day x hour mask
+            model.available = self._availability(courses)
+            if mask is not None:
+                model.available &= mask.transpose(2, 0, 1)
+            model.slots = pyo.Set(dimen=3, ordered = True, initialize=[(self.days[d], self.hours[h], course)
+                                                                       for d, h, course in self._available_slots(courses, model.available)])
+            if room_formulation == 'daily':
+                # (day, course) pairs with an available slot, and their candidate rooms
+                model.day_courses = pyo.Set(dimen=2, ordered = True, initialize=[(self.days[d], courses_list[c])
+                                                                                 for d, c in np.argwhere(model.available.any(axis=2).T)])
+                model.day_rooms = pyo.Set(dimen=3, ordered = True, initialize=[(day, course, room)
+                                                                               for day, course in model.day_courses
+                                                                               for room in model.rooms_for_course[course]])
+            elif room_formulation == 'hourly':
+                model.room_slots = pyo.Set(dimen=4, ordered = True, initialize=[(day, hour, course, room)
+                                                                                for day, hour, course in model.slots
+                                                                                for room in model.rooms_for_course[course]])
+
+        with self._phase(idx, 'variables'):
+            # Variables, unavailable slots are never created
+            model.schedule = pyo.Var(model.slots, domain=pyo.Binary)
+
+            if room_formulation == 'daily':
+                model.room_day = pyo.Var(model.day_rooms, domain=pyo.Binary)
+            elif room_formulation == 'hourly':
+                model.room_assignment = pyo.Var(model.room_slots, domain=pyo.Binary)
+
+
+        #Constraints
+        with self._phase(idx, 'single_assignment_constraint'):
             model.single_assignment_constraint = pyo.Constraint(model.days, model.hours, rule=single_assignment_constraint)
-            
-            # Max hours for the same subject per day
-            def max_hours_per_day_constraint(model, course, day):
-                return sum(model.schedule[day, hour, course] for hour in model.hours) <= 2
-            
+        with self._phase(idx, 'max_hours_per_day_constraint'):
             model.max_hours_per_day_constraint = pyo.Constraint(model.courses, model.days, rule=max_hours_per_day_constraint)
-            
-            # Constraint: Max hours for the same subject per week
-            def max_hours_per_week_constraint(model, course):
-                return sum(model.schedule[day, hour, course] for day in model.days for hour in model.hours) <= model.max_hours_per_week[course]
-            
+        with self._phase(idx, 'max_hours_per_week_constraint'):
             model.max_hours_per_week_constraint = pyo.Constraint(model.courses, rule=max_hours_per_week_constraint)
-
-
-            # Only when teacher is available
-            def teacher_availability_constraint(model, course, day):
-                # Check if teacher for the course is available on the given day
-                teacher = model.teacher[course]
-                if teacher not in model.preferencas_dias_professores or day not in model.preferencas_dias_professores[teacher]:
-                    return sum(model.schedule[day, hour, course] for hour in model.hours) == 0
-                return pyo.Constraint.Skip
-            
-            model.teacher_availability_constraint = pyo.Constraint(model.courses, model.days, rule=teacher_availability_constraint)
-
-            # Rooms Constraint and preferences
-            def room_assignment_constraint(model, day, hour, course):
-                preferred_rooms = model.discPreferenciasSala[course]  # Get preferred rooms for the course
-                random.shuffle(preferred_rooms)
-                
-                if preferred_rooms:  
-                    suitable_rooms = []  
-                    for room in preferred_rooms:
-                        if model.rooms_quantity[room] >= self.quantity_students[idx]:  # If room is big enough
-                            suitable_rooms.append(room)
-
-                    if suitable_rooms:  # If there are suitable rooms
-                        # Assign only suitable rooms
-                        return sum(model.room_assignment[day, hour, course, room] for room in suitable_rooms) == 1
-                    else:
-                        # If no suitable room found among preferred rooms, assign a temporary room
-                        return sum(model.room_assignment[day, hour, course, "Temp Room"]) == 1
-
-                else:  # If there are no preferred rooms, allow assignment to any room
-                    return sum(model.room_assignment[day, hour, course, room] for room in model.rooms) == 1
-
-            model.room_assignment_constraint = pyo.Constraint(model.days, model.hours, model.courses, rule=room_assignment_constraint)
-
-            # Subjects in a row in the same room
-            def same_room_next_to_each_other_constraint(model, day, hour, course, room):
-                if hour == model.hours.last():  # If it's the last hour of the day, skip the constraint
-                    return pyo.Constraint.Skip
-                else:
-                    next_hour = model.hours.next(hour)  # Get the next hour
-                    return model.room_assignment[day, hour, course, room] == model.room_assignment[day, next_hour, course, room]
-
-            model.same_room_next_to_each_other_constraint = pyo.Constraint(model.days, model.hours, model.courses, model.rooms, rule=same_room_next_to_each_other_constraint)
-           
-            # Join subjects
-            def remove_spaces_constraint(model, day, hour, course):
-                if hour == model.hours.first():
-                    next_hour = model.hours.next(hour)
-                    if next_hour in model.hours:
-                        return model.schedule[day, hour, course] - model.schedule[day, next_hour, course] <= 0
-                    else:
-                        return pyo.Constraint.Skip
-                elif hour == model.hours.last():
-                    prev_hour = model.hours.prev(hour)
-                    if prev_hour in model.hours:
-                        return model.schedule[day, hour, course] - model.schedule[day, prev_hour, course] <= 0
-                    else:
-                        return pyo.Constraint.Skip
-                else:
-                    next_hour = model.hours.next(hour)
-                    prev_hour = model.hours.prev(hour)
-                    if next_hour in model.hours and prev_hour in model.hours:
-                        return model.schedule[day, hour, course] - (model.schedule[day, next_hour, course] + model.schedule[day, prev_hour, course]) <= 0
-                    elif next_hour in model.hours:
-                        return model.schedule[day, hour, course] - (model.schedule[day, next_hour, course] + model.schedule[day, prev_hour, course]) <= 0
-                    elif prev_hour in model.hours:
-                        return model.schedule[day, hour, course] - (model.schedule[day, next_hour, course] + model.schedule[day, prev_hour, course]) <= 0
-                    else:
-                        return pyo.Constraint.Skip
-
-            model.remove_spaces_constraint = pyo.Constraint(model.days, model.hours, model.courses, rule=remove_spaces_constraint)
-
-
-            # Objective
-            def objective_rule(model):
-                return sum(model.schedule[d, h, c] * model.hours_per_course[c] for d in model.days for h in model.hours for c in model.courses)
-
+        if room_formulation == 'daily':
+            with self._phase(idx, 'room_day_constraint'):
+                model.room_day_constraint = pyo.Constraint(model.day_courses, rule=room_day_constraint)
+            with self._phase(idx, 'room_day_link_constraint'):
+                model.room_day_link_constraint = pyo.Constraint(model.day_courses, rule=room_day_link_constraint)
+        elif room_formulation == 'hourly':
+            with self._phase(idx, 'room_assignment_constraint'):
+                model.room_assignment_constraint = pyo.Constraint(model.slots, rule=room_assignment_constraint)
+            with self._phase(idx, 'same_room_next_to_each_other_constraint'):
+                model.same_room_next_to_each_other_constraint = pyo.Constraint(model.room_slots, rule=same_room_next_to_each_other_constraint)
+        with self._phase(idx, 'remove_spaces_constraint'):
+            model.remove_spaces_constraint = pyo.Constraint(model.slots, rule=remove_spaces_constraint)
+
+        # Objective
+        with self._phase(idx, 'objective'):
             model.objective = pyo.Objective(rule=objective_rule, sense=pyo.maximize)
 
-            self.models.append(model)
+        if self.profile is not None:
+            self.profile.count_model(idx, model)
 
+        return model
 
+    # Sets and parameters every cohort model shares: days, hours with their next / prev hour maps, rooms with
+    # their capacities and the course teachers. Built once and cloned by _build_model, so only the cohort
+    # courses and constraints are generated per cohort (changing the scheduler inputs afterwards needs
+    # self._skeleton = None)
+    def _model_skeleton(self):
+        if self._skeleton is None:
+            model = pyo.ConcreteModel()
+            model.days = pyo.Set(initialize=self.days, ordered = True)
+            # Define continuous hour set starting from 9:00 AM
+            model.hours = pyo.Set(initialize=self.hours , ordered = True)
+            model.next_hour = dict(zip(self.hours, list(self.hours[1:]) + [None]))
+            model.prev_hour = dict(zip(self.hours, [None] + list(self.hours[:-1])))
+            model.teacher_indices = pyo.Set(initialize=list(self.teachers_Subject))
+            model.teacher = pyo.Param(model.teacher_indices, initialize=self.teachers_Subject, within=pyo.Any)
+            model.rooms = pyo.Set(initialize=list(self.salas))
+            model.rooms_quantity = pyo.Param(model.rooms, initialize=self.salas, within=pyo.NonNegativeIntegers)
+            self._skeleton = model
+        return self._skeleton
+
+    # One model for several cohorts: every cohort model as a block of cohort_models, their objectives summed,
+    # and capacity rows so a room (other than the temporary one) or a teacher shared by the cohorts holds
+    # one class per slot
+    def _build_joint_model(self, cohorts):
+        cohort_courses = list(self.courses_overall.values())
+        model = pyo.ConcreteModel()
+        model.cohort = tuple(cohorts)
+        model.cohorts = pyo.Set(initialize=list(cohorts), ordered = True)
+        model.days = pyo.Set(initialize=self.days, ordered = True)
+        model.hours = pyo.Set(initialize=self.hours, ordered = True)
+        model.cohort_models = pyo.Block(model.cohorts)
+        for idx in cohorts:
+            block = model.cohort_models[idx]
+            block.transfer_attributes_from(self._build_model(idx, cohort_courses[idx]))
+            block.objective.deactivate()
+
+        model.room_classes, model.teacher_classes = self._shared_classes(cohorts)
+        model.shared_rooms = pyo.Set(initialize=list(model.room_classes))
+        model.shared_teachers = pyo.Set(initialize=list(model.teacher_classes))
+
+        model.room_uses = pyo.Set(dimen=5, ordered = True, initialize=[(idx, day, hour, course, room)
+                                                                       for room, classes in model.room_classes.items()
+                                                                       for idx, course in classes
+                                                                       for day, hour, c in model.cohort_models[idx].slots if c == course])
+        model.room_use = pyo.Var(model.room_uses, bounds=(0, 1))
+        model.room_use_constraint = pyo.Constraint(model.room_uses, rule=room_use_constraint)
+        model.room_capacity_constraint = pyo.Constraint(model.days, model.hours, model.shared_rooms, rule=room_capacity_constraint)
+        model.teacher_capacity_constraint = pyo.Constraint(model.days, model.hours, model.shared_teachers, rule=teacher_capacity_constraint)
+
+        model.objective = pyo.Objective(expr=sum(model.cohort_models[idx].objective.expr for idx in cohorts), sense=pyo.maximize)
+        return model
+
+    # (cohort, course) classes of every room and teacher needed by more than one of the cohorts
+    def _shared_classes(self, cohorts):
+        cohort_courses = list(self.courses_overall.values())
+        room_classes, teacher_classes = {}, {}
+        for idx in cohorts:
+            courses = cohort_courses[idx]
+            for course, rooms in self._suitable_rooms(courses, self.quantity_students[idx]).items():
+                for room in rooms:
+                    if room != TEMP_ROOM:
+                        room_classes.setdefault(room, []).append((idx, course))
+                if self.teachers_Subject.get(course) is not None:
+                    teacher_classes.setdefault(self.teachers_Subject[course], []).append((idx, course))
+        shared = lambda classes: len({idx for idx, _ in classes}) > 1
+        return ({room: classes for room, classes in room_classes.items() if shared(classes)},
+                {teacher: classes for teacher, classes in teacher_classes.items() if shared(classes)})
+
+    # Profile a phase of a cohort when profiling is enabled
+    def _phase(self, idx, name):
+        if self.profile is None:
+            return nullcontext()
+        return self.profile.phase(name, idx)
+
+    # Record per phase wall time, peak memory and model sizes into a profile_report from now on
+    # An existing report (e.g. one that already timed the CSV load) can be passed in
+    def enable_profiling(self, log_path=None, report=None):
+        self.profile = report if report is not None else profile_report(log_path)
+        return self.profile
+
+    # Boolean course x day x hour mask of the slots where the assigned teacher is available
+    def _availability(self, courses):
+        available = np.zeros((len(courses), len(self.days), len(self.hours)), dtype=bool)
+        for c, course in enumerate(courses):
+            teacher_days = self.preferencas_dias_professores.get(self.teachers_Subject.get(course), [])
+            available[c] = np.isin(self.days, teacher_days)[:, None]
+        return available
+
+    # (day index, hour index, course) for every available slot, in day, hour, course order
+    def _available_slots(self, courses, available):
+        courses = list(courses)
+        return [(d, h, courses[c]) for d, h, c in np.argwhere(available.transpose(1, 2, 0))]
+
+    # Preferred rooms big enough for the class, "Temp Room" when none is, every room when there is no preference
+    def _suitable_rooms(self, courses, quantity_students):
+        rooms_for_course = {}
+        for course in courses:
+            preferred_rooms = list(dict.fromkeys(self.discPreferenciasSala.get(course, [])))
+            if preferred_rooms:
+                suitable_rooms = [room for room in preferred_rooms if self.salas[room] >= quantity_students]
+                rooms_for_course[course] = suitable_rooms if suitable_rooms else [TEMP_ROOM]
+            else:
+                rooms_for_course[course] = list(self.salas)
+        return rooms_for_course
+
+
+
+    # Greedy schedule of a built cohort model written into its variables, every course keeps its first
+    # suitable room so rooms stay the same between consecutive hours
+    def _warm_start(self, model):
+        courses = list(model.courses)
+        weekly_hours = [model.max_hours_per_week[course] for course in courses]
+        schedule = greedy_blocks(model.available, weekly_hours, [model.hours_per_course[course] for course in courses])
+        slot_day, slot_hour, slot_course = np.nonzero(model.available.transpose(1, 2, 0))
+        for var, value in zip(model.schedule.values(), schedule[slot_day, slot_hour, slot_course]):
+            var.set_value(int(value))
+        if model.room_formulation == 'daily':
+            scheduled_days = {(day, course) for (day, hour, course), var in model.schedule.items() if var.value}
+            for (day, course, room), var in model.room_day.items():
+                var.set_value(int((day, course) in scheduled_days and room == model.rooms_for_course[course][0]))
+        elif model.room_formulation == 'hourly':
+            for (day, hour, course, room), var in model.room_assignment.items():
+                var.set_value(int(room == model.rooms_for_course[course][0]))
+        model.warm_started = True
+
+    # Greedy schedule of a cohort without building or solving its model, an instant fallback
+    def greedy_solution(self, idx, courses):
+        schedule = greedy_blocks(self._availability(courses), list(courses.values()), list(courses.values()))
+        return self._block_solution(idx, courses, schedule)
+
+    # Local search from the greedy schedule, stops after iterations or at the solver time limits
+    def search_solution(self, idx, courses, iterations=200000, seed=0):
+        available = self._availability(courses)
+        weekly_hours = list(courses.values())
+        start = greedy_blocks(available, weekly_hours, weekly_hours)
+        schedule = anneal_blocks(available, weekly_hours, weekly_hours, start, iterations=iterations, seed=seed,
+                                 time_limit=self._solver_options().get('seconds'))
+        return self._block_solution(idx, courses, schedule)
+
+    # cohort_solution of a heuristic schedule, every course sits in its first suitable room
+    def _block_solution(self, idx, courses, schedule):
+        rooms = list(self.salas)
+        first_room = [rooms.index(suitable[0]) for suitable in self._suitable_rooms(courses, self.quantity_students[idx]).values()]
+        room = np.where(schedule, np.array(first_room, dtype=int), -1)
+        return cohort_solution(self.days, self.hours, courses, rooms, schedule, room, suboptimal=True)
+
+    def greedy_solutions(self):
+        self.solutions = [self.greedy_solution(idx, courses) for idx, courses in enumerate(self.courses_overall.values())]
+        return self.solutions
 
     #Solve the model
-    def solve(self):
+    # backend=None solves the models built by create_model with the configured backend, a backend name
+    # ('cbc', 'highs', 'cpsat') sets it first with options passed to set_backend, backend='search' runs
+    # the local search on every cohort without building a model (options: iterations, seed).
+    # Returns a cohort_result per cohort. With fail_fast the remaining cohorts are not solved once one
+    # is proven infeasible, their results say 'cancelled' and a RuntimeError is raised.
+    def solve(self, backend=None, fail_fast=False, **options):
+        if backend == 'search':
+            return self.solve_search(**options)
+        if backend is not None:
+            self.set_backend(backend, **options)
+        # The run budget counts from create_model when the models were just built
+        self._start_clock(self.build_start)
+        self.build_start = None
+        self.results = []
         for model in self.models:
-            solver = pyo.SolverFactory('cbc')
-            #solver = pyo.SolverFactory('gurobi')
-            result = solver.solve(model)
+            if fail_fast and any(result.infeasible for result in self.results):
+                self.results.append(cohort_result(model.cohort, 'cancelled'))
+                continue
+            self._solve_model(model)
+            self.results.append(model.result)
+            print(model.result)
+        self._check_infeasible(fail_fast)
+        self.extract_solutions()
+        self._write_profile()
+        return self.results
+
+    def solve_search(self, iterations=200000, seed=0):
+        self._start_clock()
+        self.solutions, self.results = [], []
+        for idx, courses in enumerate(self.courses_overall.values()):
+            start = time.perf_counter()
+            with self._phase(idx, 'search'):
+                solution = self.search_solution(idx, courses, iterations, seed)
+            objective = float(solution.schedule.sum(axis=(0, 1)) @ np.array(list(courses.values())))
+            result = cohort_result(idx, 'search', objective, seconds=time.perf_counter() - start, suboptimal=True)
+            print(result)
+            self.solutions.append(solution)
+            self.results.append(result)
+        self._write_profile()
+        return self.results
+
+    def _check_infeasible(self, fail_fast):
+        infeasible = [result.cohort for result in self.results if result.infeasible]
+        if fail_fast and infeasible:
+            raise RuntimeError(f"Cohort {infeasible[0]} is infeasible, the other cohort solves were cancelled")
+
+    # Anytime solving: seconds per cohort, seconds for the whole run, relative gap and branch and bound
+    # node limit. A cohort stopped by a limit keeps the best schedule found and is flagged suboptimal.
+    def set_limits(self, time_limit=None, total_time_limit=None, gap=None, node_limit=None):
+        self.time_limit = time_limit
+        self.total_time_limit = total_time_limit
+        self.gap = gap
+        self.node_limit = node_limit
+
+    # Solver of every later model solve: 'cbc', 'highs' or 'cpsat', workers threads and solver specific
+    # parameters passed through, e.g. set_backend('cpsat', workers=8, log_search_progress=True)
+    def set_backend(self, name, workers=None, **options):
+        self.backend = make_backend(name, workers, **options)
+        return self.backend
+
+    def _start_clock(self, start=None):
+        start = start or time.time()
+        self.deadline = start + self.total_time_limit if self.total_time_limit is not None else None
+
+    # Limits of the next solve under their CBC names, the backend renames them. The cohort time limit
+    # is cut to what is left of the run budget, unless run_budget is False (the budget moves with the clock)
+    def _solver_options(self, run_budget=True):
+        options = {}
+        seconds = self.time_limit
+        if run_budget and self.deadline is not None:
+            # _solve_model skips the solve once the budget is spent, the last one gets at least a second
+            remaining = max(self.deadline - time.time(), 1)
+            seconds = remaining if seconds is None else min(seconds, remaining)
+        if seconds is not None:
+            options['seconds'] = seconds
+        if self.gap is not None:
+            options['ratioGap'] = self.gap
+        if self.node_limit is not None:
+            options['maxNodes'] = self.node_limit
+        return options
+
+    def _out_of_time(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    def _solve_model(self, model):
+        if self._out_of_time():
+            return self._skip_solve(model)
+        # Joint models start cold, the greedy schedules of their cohorts may clash on shared rooms and teachers
+        warm_start = self.warm_start and hasattr(model, 'available')
+        if warm_start:
+            with self._phase(model.cohort, 'warm_start'):
+                self._warm_start(model)
+        with self._phase(model.cohort, 'solve'):
+            start = time.perf_counter()
+            result = self.backend.solve(model, self._solver_options(), warm_start)
+            model.solve_seconds = time.perf_counter() - start
+        with self._phase(model.cohort, 'solution_load'):
+            _load_incumbent(model, result)
+        if self.profile is not None:
+            self.profile.record_solver(model.cohort, result)
+        model.result = _cohort_result(model, result)
+        return result
+
+    # Run budget used up: no solver run. A model solved before keeps its schedule, a new one gets the greedy
+    # schedule when warm starts are on and none otherwise; its result says 'cancelled'
+    def _skip_solve(self, model):
+        if not getattr(model, 'has_solution', False):
+            model.has_solution = False
+            if self.warm_start and hasattr(model, 'available'):
+                self._warm_start(model)
+        model.suboptimal = True
+        if model.has_solution:
+            found = "keeping the last schedule"
+        elif getattr(model, 'warm_started', False):
+            found = "keeping the greedy schedule"
+        else:
+            found = "no schedule"
+        print(f"Cohort {model.cohort}: run time budget used up, {found}")
+        objective = _finite(pyo.value(model.objective, exception=False))
+        model.result = cohort_result(model.cohort, 'cancelled', objective, suboptimal=True)
+        return None
+
+    # Cohort reached once the run budget is spent is neither built nor solved: greedy schedule when warm
+    # starts are on, an empty one otherwise
+    def _skipped_cohort(self, idx, courses):
+        shape = (len(self.days), len(self.hours), len(courses))
+        if self.warm_start:
+            solution = self.greedy_solution(idx, courses)
+        else:
+            solution = self._block_solution(idx, courses, np.zeros(shape, dtype=bool))
+        objective = float(solution.schedule.sum(axis=(0, 1)) @ np.array(list(courses.values())))
+        print(f"Cohort {idx}: run time budget used up, {'keeping the greedy schedule' if self.warm_start else 'no schedule'}")
+        return solution, cohort_result(idx, 'cancelled', objective if self.warm_start else None, suboptimal=True)
+
+    # Build and solve every cohort in a process pool, cohorts are independent models.
+    # With fail_fast, once a cohort is proven infeasible the cohorts not started yet are cancelled and
+    # the worker processes are terminated together with the solves running in them.
+    def solve_parallel(self, workers=None, fail_fast=False):
+        self.models = []
+        self._start_clock()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_own_process_group if fail_fast else None)
+        futures = {pool.submit(_build_and_solve_cohort, self, idx, courses): idx
+                   for idx, courses in enumerate(self.courses_overall.values())}
+        done = {}
+        pending = set(futures)
+        try:
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done[futures[future]] = future.result()
+                if fail_fast and any(result.infeasible for _, _, result, _ in done.values()):
+                    break
+        finally:
+            # A fail_fast run left early by an infeasible cohort, Ctrl-C or a failed cohort: nothing waits for
+            # the running solves, whose workers Ctrl-C does not reach. Stopping the workers fails the pending
+            # futures; cancelling them first would make the executor raise on them
+            stopped = fail_fast and any(not future.done() for future in futures)
+            if stopped:
+                _terminate_workers(pool)
+            pool.shutdown(wait=not stopped, cancel_futures=stopped)
+
+        # Collect back in cohort order
+        self.results, self.solutions = [], []
+        for idx in range(len(futures)):
+            if idx not in done:
+                self.results.append(cohort_result(idx, 'cancelled'))
+                continue
+            model, solution, result, profile = done[idx]
+            if model is not None:
+                self.models.append(model)
+            self.solutions.append(solution)
+            self.results.append(result)
+            print(result)
+            if self.profile is not None:
+                self.profile.merge_cohort(idx, profile)
+        self._check_infeasible(fail_fast)
+        self._write_profile()
+        return self.results
+
+    # Reuse the cached solution of every cohort whose inputs are unchanged, build and solve the others,
+    # in a process pool when workers > 1
+    def solve_cached(self, cache, seed=None, workers=None):
+        self.models = []
+        self._start_clock()
+        # A schedule solved with other limits or another backend is not reused
+        solver_options = {'limits': self._solver_options(run_budget=False), 'backend': self.backend.name,
+                          'workers': self.backend.workers, 'options': self.backend.options}
+        cohorts = list(self.courses_overall.values())
+        keys = [cache.key(self, idx, courses, solver_options, seed=seed) for idx, courses in enumerate(cohorts)]
+        cached = [cache.get(key) for key in keys]
+        missing = [idx for idx, solution in enumerate(cached) if solution is None]
+        if workers and workers > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                solved = list(pool.map(_build_and_solve_cohort, [self] * len(missing), missing,
+                                       [cohorts[idx] for idx in missing]))
+        else:
+            solved = [_build_and_solve_cohort(self, idx, cohorts[idx]) for idx in missing]
+        solved = dict(zip(missing, solved))
+
+        self.solutions, self.results = [], []
+        for idx, courses in enumerate(cohorts):
+            if idx in solved:
+                model, solution, result, profile = solved[idx]
+                # Schedules cut short by a limit, or by the run budget before a solve, are not worth keeping
+                if model is not None:
+                    self.models.append(model)
+                    if not solution.suboptimal and model.has_solution:
+                        cache.put(keys[idx], solution)
+                if self.profile is not None:
+                    self.profile.merge_cohort(idx, profile)
+            else:
+                solution = cached[idx]
+                objective = float(solution.schedule.sum(axis=(0, 1)) @ np.array(list(courses.values())))
+                result = cohort_result(idx, 'cached', objective)
             print(result)
+            self.solutions.append(solution)
+            self.results.append(result)
+        self._write_profile()
+        return self.results
+
+    # Write the profile at the end of a solve and stop its allocation tracing (a later phase starts it again)
+    def _write_profile(self):
+        if self.profile is not None:
+            if self.profile.log_path:
+                self.profile.write_json()
+            self.profile.stop()
+
+    # Pull every solved model into a cohort_solution once, renderers and exporters read from these
+    def extract_solutions(self):
+        self.solutions = [extract_solution(model) for model in self.models]
+        return self.solutions
+
+    # Tidy table of every cohort's scheduled cells
+    def solution_frame(self):
+        frames = []
+        for cohort, solution in zip(self.courses_overall, self._solved()):
+            frame = solution.frame()
+            frame.insert(0, 'cohort', cohort)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+    def _solved(self):
+        if not self.solutions:
+            self.extract_solutions()
+        return self.solutions
             
 
     def _create_course_abbreviations(self):
@@ -225,31 +857,24 @@ class course_scheduler:
             3: 'LS',
         }
         
-        for idx, model in enumerate(self.models):
+        for idx, solution in enumerate(self._solved()):
            
             class_name = class_names.get(idx, f'Class {idx+1}')
             
             print(f"Schedule for {class_name}:")
             print("+" + "-" * 150 + "+")
             print("| {:^25} |".format("Time/Day"), end="")
-            for day in model.days:
+            for day in solution.days:
                 print(" {:^20} |".format(day), end="")
             print("\n+" + "-" * 150 + "+")
-            for hour in model.hours:
+            for h, hour in enumerate(solution.hours):
                 print("| {:^25} |".format(hour), end="")
-                for day in model.days:
-                    for course in model.courses:
-                        if model.schedule[day, hour, course].value == 1:
-                            
-                            course_abbr = self.abbreviations_miaa.get(course, self.abbreviations_leec.get(course, self.abbreviations_legi.get(course, self.abbreviations_ls.get(course, course))))
-                            
-                            assigned_room = None
-                            for room in model.rooms:
-                                if model.room_assignment[day, hour, course, room].value == 1:
-                                    assigned_room = room
-                                    break
-                            print(" {:^15} ({:^5})|".format(course_abbr, assigned_room), end="")
-                            break
+                for d in range(len(solution.days)):
+                    cell = solution.cell(d, h)
+                    if cell is not None:
+                        course, assigned_room = cell
+                        course_abbr = self.abbreviations_miaa.get(course, self.abbreviations_leec.get(course, self.abbreviations_legi.get(course, self.abbreviations_ls.get(course, course))))
+                        print(" {:^15} ({:^5})|".format(course_abbr, assigned_room), end="")
                     else:
                         print(" {:^20} |".format("N"), end="")
                 print("\n+" + "-" * 150 + "+")
@@ -275,24 +900,19 @@ class course_scheduler:
         pdf = SimpleDocTemplate(filename, pagesize=letter)
         elems = []
 
-        for idx, model in enumerate(self.models):
+        for idx, solution in enumerate(self._solved()):
             # Create  table for each course
-            data = [["Time/Day"] + [day for day in model.days]]
+            data = [["Time/Day"] + [day for day in solution.days]]
 
-            for hour in model.hours:
+            for h, hour in enumerate(solution.hours):
                 row = [hour]
-                for day in model.days:
+                for d in range(len(solution.days)):
                     course_info = ""
-                    for course in model.courses:
-                        if model.schedule[day, hour, course].value == 1:
-                            course_abbr = self.abbreviations_miaa.get(course, self.abbreviations_leec.get(course, self.abbreviations_legi.get(course, self.abbreviations_ls.get(course, course))))
-                            assigned_room = None
-                            for room in model.rooms:
-                                if model.room_assignment[day, hour, course, room].value == 1:
-                                    assigned_room = room
-                                    break
-                            course_info = f"{course_abbr} ({assigned_room})"
-                            break
+                    cell = solution.cell(d, h)
+                    if cell is not None:
+                        course, assigned_room = cell
+                        course_abbr = self.abbreviations_miaa.get(course, self.abbreviations_leec.get(course, self.abbreviations_legi.get(course, self.abbreviations_ls.get(course, course))))
+                        course_info = f"{course_abbr} ({assigned_room})"
                     row.append(course_info)
                 data.append(row)
 
@@ -0,0 +1,88 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pyomo.environ as pyo
+from pyomo.core.expr.visitor import identify_variables
+
+
+# Wall time and peak memory of every phase of a scheduler run, plus per cohort model sizes.
+# Run-wide phases (e.g. csv_load) go to phases, cohort phases (sets/params, each constraint
+# family, objective, solve, solution_load) go to cohorts[idx]['phases'].
+class profile_report:
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.phases = []
+        self.cohorts = {}
+        # Whether this report turned tracemalloc on, stop() only turns off tracing it started
+        self.started_tracing = False
+
+    def cohort(self, idx):
+        return self.cohorts.setdefault(idx, {'phases': [], 'families': {}, 'solver': {}})
+
+    # Time a block, peak_bytes is the allocation high-water mark above the memory in use when it started
+    @contextmanager
+    def phase(self, name, cohort=None):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            target = self.phases if cohort is None else self.cohort(cohort)['phases']
+            target.append({'phase': name, 'seconds': seconds, 'peak_bytes': max(peak - base, 0)})
+
+    # Stop the allocation tracing this report started, it slows down everything running after the profile
+    def stop(self):
+        if self.started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.started_tracing = False
+
+    # Variable, constraint and nonzero counts of every component family of a built model
+    def count_model(self, idx, model):
+        families = self.cohort(idx)['families']
+        for var in model.component_objects(pyo.Var, active=True):
+            families[var.name] = {'variables': len(var), 'constraints': 0, 'nonzeros': 0}
+        for con in model.component_objects(pyo.Constraint, active=True):
+            nonzeros = sum(sum(1 for _ in identify_variables(data.body, include_fixed=False)) for data in con.values())
+            families[con.name] = {'variables': 0, 'constraints': len(con), 'nonzeros': nonzeros}
+
+    # Solver-reported time of a solve; the rest of the solve phase is writing the problem and reading the answer
+    def record_solver(self, idx, result):
+        cohort = self.cohort(idx)
+        solve = [p['seconds'] for p in cohort['phases'] if p['phase'] == 'solve']
+        solver_time = getattr(result.solver, 'wallclock_time', None) or getattr(result.solver, 'time', None)
+        info = {'termination_condition': str(result.solver.termination_condition)}
+        if isinstance(solver_time, (int, float)):
+            info['solver_seconds'] = float(solver_time)
+            if solve:
+                info['write_and_read_seconds'] = max(solve[-1] - float(solver_time), 0.0)
+        cohort['solver'] = info
+
+    # Fold in the cohort entry of a report filled by a worker process
+    def merge_cohort(self, idx, data):
+        if data is not None:
+            self.cohorts[idx] = data
+
+    def to_dict(self):
+        return {'phases': self.phases, 'cohorts': {str(idx): data for idx, data in self.cohorts.items()}}
+
+    def write_json(self, path=None):
+        path = path or self.log_path
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    # Phases over all cohorts sorted by total time, the first rows are the bottleneck
+    def summary(self):
+        totals = {}
+        for entry in self.phases + [p for data in self.cohorts.values() for p in data['phases']]:
+            total = totals.setdefault(entry['phase'], {'phase': entry['phase'], 'seconds': 0.0, 'peak_bytes': 0})
+            total['seconds'] += entry['seconds']
+            total['peak_bytes'] = max(total['peak_bytes'], entry['peak_bytes'])
+        return sorted(totals.values(), key=lambda total: -total['seconds'])
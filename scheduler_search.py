@@ -0,0 +1,109 @@
+import math
+import time
+
+import numpy as np
+
+
+# Moves drawn at once; memory stays flat for any number of iterations and the time limit is checked
+# between chunks
+CHUNK = 1000
+
+
+# Simulated annealing over the two-hour blocks of one cohort.
+# A course holds at most two hours a day and never a lone hour, so every feasible schedule of the cohort
+# model is a set of (course, day) blocks of two consecutive hours. The state is the start hour of every
+# block (-1 for none) plus the day x hour occupant grid, which makes the feasibility check and the objective
+# delta of every move O(1):
+#   add      a block of a course below its weekly hours in a free pair, evicting the blocks in the way
+#   move     a block to a free pair on another day of its teacher
+#   remove   a block
+# available is the course x day x hour mask of the model, start an optional day x hour x course schedule
+# made of blocks (e.g. the greedy one). Returns the best day x hour x course schedule found.
+def anneal_blocks(available, weekly_hours, weights, start=None, iterations=200000, temperature=None,
+                  cooling=None, seed=0, time_limit=None):
+    n_courses, n_days, n_hours = available.shape
+    weights = np.asarray(weights, dtype=float)
+    limit = np.asarray(weekly_hours, dtype=int) // 2
+    # Block starts where the teacher is available for both hours
+    startable = available[:, :, :-1] & available[:, :, 1:]
+
+    block = np.full((n_courses, n_days), -1, dtype=int)
+    occupant = np.full((n_days, n_hours), -1, dtype=int)
+    count = np.zeros(n_courses, dtype=int)
+    if start is not None:
+        for d, c in zip(*np.nonzero(start.any(axis=1))):
+            h = np.flatnonzero(start[d, :, c])[0]
+            block[c, d] = h
+            occupant[d, h:h + 2] = c
+            count[c] += 1
+
+    value = 2 * float(weights @ count)
+    best_value, best_block = value, block.copy()
+
+    rng = np.random.default_rng(seed)
+    temperature = temperature if temperature is not None else 2 * float(weights.max(initial=1))
+    # Geometric cooling down to a thousandth of the start temperature over the run
+    cooling = cooling if cooling is not None else 1e-3 ** (1 / max(iterations, 1))
+    deadline = time.time() + time_limit if time_limit is not None else None
+
+    def place(c, d, h):
+        block[c, d] = h
+        occupant[d, h:h + 2] = c
+        count[c] += 1
+
+    def lift(c, d):
+        h = block[c, d]
+        occupant[d, h:h + 2] = -1
+        block[c, d] = -1
+        count[c] -= 1
+
+    for i in range(iterations):
+        j = i % CHUNK
+        if j == 0:
+            if deadline is not None and time.time() > deadline:
+                break
+            size = min(CHUNK, iterations - i)
+            courses = rng.integers(n_courses, size=size)
+            days = rng.integers(n_days, size=size)
+            hours = rng.integers(max(n_hours - 1, 1), size=size)
+            kinds = rng.random(size)
+            accept = rng.random(size)
+        temperature *= cooling
+        c, d, h = courses[j], days[j], hours[j]
+        if n_hours < 2 or not startable[c, d, h]:
+            continue
+
+        if block[c, d] < 0:
+            if count[c] >= limit[c]:
+                continue
+            # Add, evicting whatever blocks hold the two hours
+            evicted = {occupant[d, h], occupant[d, h + 1]} - {-1}
+            delta = 2 * (weights[c] - sum(weights[e] for e in evicted))
+            if delta < 0 and accept[j] >= math.exp(delta / temperature):
+                continue
+            for e in evicted:
+                lift(e, d)
+            place(c, d, h)
+        elif kinds[j] < 0.5:
+            # Move the block of this day to the drawn hour of a random other day
+            d2 = (d + 1 + int(kinds[j] * 2 * (n_days - 1))) % n_days if n_days > 1 else d
+            if d2 == d or block[c, d2] >= 0 or not startable[c, d2, h] or occupant[d2, h] >= 0 or occupant[d2, h + 1] >= 0:
+                continue
+            lift(c, d)
+            place(c, d2, h)
+            delta = 0.0
+        else:
+            delta = -2 * weights[c]
+            if accept[j] >= math.exp(delta / temperature):
+                continue
+            lift(c, d)
+
+        value += delta
+        if value > best_value:
+            best_value, best_block = value, block.copy()
+
+    schedule = np.zeros((n_days, n_hours, n_courses), dtype=bool)
+    for c, d in zip(*np.nonzero(best_block >= 0)):
+        h = best_block[c, d]
+        schedule[d, h:h + 2, c] = True
+    return schedule
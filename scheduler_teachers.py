@@ -0,0 +1,76 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+
+# Weekly hours of every subject summed over the cohorts, courses_overall as a {cohort: courses} dict or a list
+def course_hours(courses_overall):
+    cohorts = courses_overall.values() if isinstance(courses_overall, dict) else courses_overall
+    hours = {}
+    for courses in cohorts:
+        for course, h in courses.items():
+            hours[course] = hours.get(course, 0) + h
+    return hours
+
+
+# One qualified teacher per course from a small MIP: maximise the available days of the chosen teachers
+# minus balance x the weekly hours of the most loaded teacher. Teachers without available days are never
+# chosen, courses without any such teacher get None. A seed adds random tie-breaking noise below half a day.
+def assign_teachers(teachers_Subject, preferencas_dias_professores, hours=None, balance=0.25, seed=None):
+    assignment = {course: None for course in teachers_Subject}
+    pairs = [(course, teacher) for course, teachers in teachers_Subject.items()
+             for teacher in dict.fromkeys(teachers) if preferencas_dias_professores.get(teacher)]
+    if not pairs:
+        return assignment
+    hours = hours or {}
+    courses = list(dict.fromkeys(course for course, _ in pairs))
+    teachers = list(dict.fromkeys(teacher for _, teacher in pairs))
+    pair_course = np.array([courses.index(course) for course, _ in pairs])
+    pair_teacher = np.array([teachers.index(teacher) for _, teacher in pairs])
+    pair_hours = np.array([hours.get(course, 1) for course, _ in pairs], dtype=float)
+    days = np.array([len(set(preferencas_dias_professores[teacher])) for _, teacher in pairs], dtype=float)
+    if seed is not None:
+        days += np.random.default_rng(seed).random(len(pairs)) * 0.5
+
+    # Columns: one binary per (course, teacher) pair, then the max load
+    n = len(pairs)
+    objective = np.append(-days, balance)
+    one_teacher = sparse.csr_matrix((np.ones(n), (pair_course, np.arange(n))), shape=(len(courses), n + 1))
+    load = sparse.hstack([sparse.csr_matrix((pair_hours, (pair_teacher, np.arange(n))), shape=(len(teachers), n)),
+                          sparse.csr_matrix(-np.ones((len(teachers), 1)))])
+    constraints = [LinearConstraint(one_teacher, 1, 1), LinearConstraint(load, -np.inf, 0)]
+    integrality = np.append(np.ones(n), 0)
+    bounds = Bounds(np.zeros(n + 1), np.append(np.ones(n), np.inf))
+    result = milp(objective, constraints=constraints, integrality=integrality, bounds=bounds)
+    if result.x is None:
+        raise RuntimeError(f"Teacher assignment failed: {result.message}")
+
+    for p in np.flatnonzero(result.x[:n] > 0.5):
+        assignment[pairs[p][0]] = pairs[p][1]
+    return assignment
+
+
+# Available days of the chosen teachers minus balance x the max load, the objective assign_teachers maximises
+def assignment_score(assignment, preferencas_dias_professores, hours=None, balance=0.25):
+    hours = hours or {}
+    days = sum(len(set(preferencas_dias_professores.get(teacher, []))) for teacher in assignment.values() if teacher)
+    load = {}
+    for course, teacher in assignment.items():
+        if teacher:
+            load[teacher] = load.get(teacher, 0) + hours.get(course, 1)
+    return days - balance * max(load.values(), default=0)
+
+
+# Assignments for several seeds in a process pool, keeping the best by score(assignment)
+# (assignment_score by default; e.g. the hours a greedy schedule places with it)
+def assign_teachers_best(teachers_Subject, preferencas_dias_professores, hours=None, balance=0.25,
+                         seeds=range(8), workers=None, score=None):
+    score = score or (lambda assignment: assignment_score(assignment, preferencas_dias_professores, hours, balance))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(assign_teachers, teachers_Subject, preferencas_dias_professores, hours, balance, seed)
+                   for seed in seeds]
+        candidates = [future.result() for future in futures]
+    # First best in seed order, so the result does not depend on scheduling
+    return max(candidates, key=score)
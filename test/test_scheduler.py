@@ -2,6 +2,9 @@ from scheduler_model import course_scheduler
 import numpy as np 
 import random
 if __name__ == "__main__":
+    # Fixed seed so runs are reproducible
+    random.seed(0)
+
     # Args 
     days = ['Segunda','Terca','Quarta','Quinta', 'Sexta','Segunda2','Terca2','Quarta2','Quinta2', 'Sexta2']
     hours = [f"h_{i}" for i in np.array([8, 10, 14, 16])]
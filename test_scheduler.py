@@ -1,117 +1,78 @@
+from contextlib import nullcontext
+
 from scheduler_model import course_scheduler
-import random
-import csv
+from scheduler_bundle import import_bundle
+from scheduler_cache import solution_cache
+from scheduler_components import solve_components
+from scheduler_decompose import solve_two_phase
+from scheduler_lagrange import solve_lagrangian
+from scheduler_io import load_inputs
+from scheduler_profile import profile_report
+from scheduler_teachers import assign_teachers, assign_teachers_best, course_hours
 
 
-def assign_teachers_to_courses(teachers_Subject, preferencas_dias_professores):
+def assign_teachers_to_courses(teachers_Subject, preferencas_dias_professores, hours, seeds=None):
     """
-    Assigns one respective teacher for each course based on teacher availability preferences.
+    Assigns one respective teacher for each course, maximising the available days of the chosen teachers
+    and balancing their weekly hours, hours being the course_hours of the cohorts.
+    Courses without an available teacher get None.
+    seeds (e.g. range(8)) are tie-breaking seeds tried in parallel, keeping the best assignment.
     """
-    course_teachers = {}
-    for course, teachers in teachers_Subject.items():
-        available_teachers = [teacher for teacher in teachers if preferencas_dias_professores.get(teacher)]
-        if available_teachers:
-            selected_teacher = random.choice(available_teachers)
-            course_teachers[course] = selected_teacher
-        else:
-            # If no available teacher found, assign None
-            course_teachers[course] = None
-    return course_teachers
-
-
-def csv_getvalues_courses(csv_file, encoding='utf-8'):
-    courses_overall = {}
-    with open(csv_file, newline='', encoding=encoding) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel')
-        for row in reader:
-            course = row['\ufeffcourse']
-            subject = row['subj']
-            quantity = int(row['quantityOfClasses'])
-            if course not in courses_overall:
-                courses_overall[course] = {subject: quantity}
-            else:
-                if subject in courses_overall[course]:
-                    courses_overall[course][subject] += quantity
-                else:
-                    courses_overall[course][subject] = quantity
-    return courses_overall
-
-
-def read_rooms_from_csv(csv_file, encoding='utf-8'):
-    
-    rooms = {}
-    with open(csv_file, newline='', encoding=encoding) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel')
-        for row in reader:
-            room = row['\ufeffsala']
-            capacity = int(row['size'])
-            rooms[room] = capacity
-    return rooms
-
-def read_course_room_preferences_from_csv(csv_file, encoding='utf-8'):
-    
-    preferences = {}
-    with open(csv_file, newline='', encoding=encoding) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel')
-        for row in reader:
-            course = row['\ufeffsubj']
-            room = row['salas']
-            if course in preferences:
-                preferences[course].append(room)
-            else:
-                preferences[course] = [room]
-    return preferences
-
-def read_teacher_course_preferences_from_csv(csv_file, encoding='utf-8'):
-    
-    preferences = {}
-    with open(csv_file, newline='', encoding=encoding) as csvfile:
-        reader = csv.DictReader(csvfile, dialect='excel')
-        for row in reader:
-            course = row['\ufeffsubj']
-            teacher = row['professores']
-            if course in preferences:
-                preferences[course].append(teacher)
-            else:
-                preferences[course] = [teacher]
-    return preferences
-
+    if seeds:
+        return assign_teachers_best(teachers_Subject, preferencas_dias_professores, hours, seeds=seeds)
+    return assign_teachers(teachers_Subject, preferencas_dias_professores, hours)
 
 
-def read_teacher_availability_from_csv(csv_file, encoding='utf-8'):
-    
-    availability = {}
-    with open(csv_file, newline='', encoding=encoding) as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            teacher = row['\ufeffprofessores']
-            day = row['dias']
-            if teacher in availability:
-                availability[teacher].append(day)
-            else:
-                availability[teacher] = [day]
-    return availability
-
 if __name__ == "__main__":
   
 
     days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
     hours = [9, 10, 11, 12,13, 14, 15, 16, 17]
 
-    salas = read_rooms_from_csv("salas.csv")
-    discPreferenciasSala = read_course_room_preferences_from_csv("subjects_preferencias.csv")
-    teachers_Subject = read_teacher_course_preferences_from_csv("subjects_professores.csv")
-    preferencas_dias_professores = read_teacher_availability_from_csv("professores_preferencias.csv")
-    courses_overall = csv_getvalues_courses("courses.csv")
+    # Per phase wall time and peak memory, written to profile_path after the solve (None turns it off)
+    profile_path = None
+    profile = profile_report(profile_path) if profile_path else None
+
+    # Load and validate every input CSV in one pass
+    with profile.phase('csv_load') if profile else nullcontext():
+        inputs = load_inputs(".", days)
+    salas = inputs.salas()
+    discPreferenciasSala = inputs.discPreferenciasSala()
+    teachers_Subject = inputs.teachers_Subject()
+    preferencas_dias_professores = inputs.preferencas_dias_professores()
+    courses_overall = inputs.courses_overall()
 
     quantity_students = [20,20,22,20]
     
     max_hours_per_day = 8
 
+    # Worker processes for the cohort models, 1 keeps the serial build and solve (the cached solve
+    # uses them for the cohorts missing from the cache)
+    workers = 1
+    # Solver of the cohort models: 'cbc', 'highs' or 'cpsat', with its threads and solver parameters
+    solver_backend = 'cbc'
+    solver_threads = None
+    solver_parameters = {}
+
+    # Cohorts whose inputs did not change are read back from the solution cache
+    use_cache = True
+    # Schedule first and match rooms afterwards, keeping rooms free across cohorts
+    two_phase = False
+    # Solve cohorts sharing a teacher or room together, so they never clash on them
+    joint_components = False
+    # Price the shared rooms and teachers instead, the cohort models stay separate and solve in parallel
+    lagrangian = False
+    # Directory of a bundle written with scheduler_bundle.py export and solved offline with its run.sh,
+    # its schedules are read back instead of solving
+    bundle_dir = None
+    # Tie-breaking seeds of the teacher assignment tried in parallel, None for the single deterministic one
+    teacher_seeds = None
+
     teachers_chosen = {}
 
     # Assign teachers to courses
-    assigned_teachers = assign_teachers_to_courses(teachers_Subject, preferencas_dias_professores)
+    assigned_teachers = assign_teachers_to_courses(teachers_Subject, preferencas_dias_professores,
+                                                   course_hours(courses_overall), teacher_seeds)
     print("Assigned Teachers to Courses:")
     for course, teacher in assigned_teachers.items():
         print(f"{course}: {teacher}")
@@ -119,8 +80,31 @@ if __name__ == "__main__":
 
     # Create the scheduler and solve the model
     scheduler = course_scheduler(days, hours, courses_overall, max_hours_per_day,teachers_chosen, preferencas_dias_professores,salas,discPreferenciasSala,quantity_students)
-    scheduler.create_model()
-    result = scheduler.solve()
+    if profile_path:
+        scheduler.enable_profiling(report=profile)
+    scheduler.set_backend(solver_backend, solver_threads, **solver_parameters)
+    # Wall clock bounds of the solve: seconds per cohort, seconds for all cohorts, relative gap, node limit
+    scheduler.set_limits(time_limit=60, total_time_limit=300, gap=None, node_limit=None)
+    if bundle_dir:
+        import_bundle(bundle_dir, scheduler)
+    elif lagrangian:
+        solve_lagrangian(scheduler, workers=workers)
+    elif joint_components:
+        solve_components(scheduler, workers)
+    elif two_phase:
+        solve_two_phase(scheduler)
+    elif use_cache:
+        scheduler.solve_cached(solution_cache(), workers=workers)
+    elif workers > 1:
+        # Build and solve the cohorts concurrently
+        scheduler.solve_parallel(workers)
+    else:
+        scheduler.create_model()
+        results = scheduler.solve()
+
+    # The other solve paths do not write the profile, stop its tracing before printing
+    if profile:
+        profile.stop()
 
     # Print the schedule
     scheduler.print_schedule()  # Add this line to print the schedule
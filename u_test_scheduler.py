@@ -1,22 +1,18 @@
 from u_scheduler_model import course_scheduler
-import random
+from scheduler_teachers import assign_teachers, assign_teachers_best, course_hours
 
 
 
-def assign_teachers_to_courses(teachers_Subject, preferencas_dias_professores):
+def assign_teachers_to_courses(teachers_Subject, preferencas_dias_professores, hours, seeds=None):
     """
-    Assigns one respective teacher for each course based on teacher availability preferences.
+    Assigns one respective teacher for each course, maximising the available days of the chosen teachers
+    and balancing their weekly hours, hours being the course_hours of the cohorts.
+    Courses without an available teacher get None.
+    seeds (e.g. range(8)) are tie-breaking seeds tried in parallel, keeping the best assignment.
     """
-    course_teachers = {}
-    for course, teachers in teachers_Subject.items():
-        available_teachers = [teacher for teacher in teachers if preferencas_dias_professores.get(teacher)]
-        if available_teachers:
-            selected_teacher = random.choice(available_teachers)
-            course_teachers[course] = selected_teacher
-        else:
-            # If no available teacher found, assign None
-            course_teachers[course] = None
-    return course_teachers
+    if seeds:
+        return assign_teachers_best(teachers_Subject, preferencas_dias_professores, hours, seeds=seeds)
+    return assign_teachers(teachers_Subject, preferencas_dias_professores, hours)
 
 
 
@@ -142,7 +138,7 @@ if __name__ == "__main__":
     teachers_chosen = {}
 
     # Use the new function to assign teachers to courses
-    assigned_teachers = assign_teachers_to_courses(teachers_Subject, preferencas_dias_professores)
+    assigned_teachers = assign_teachers_to_courses(teachers_Subject, preferencas_dias_professores, course_hours(courses_overall))
     print("Assigned Teachers to Courses:")
     for course, teacher in assigned_teachers.items():
         print(f"{course}: {teacher}")